@@ -0,0 +1,168 @@
+"""高并发对比：threaded 与 gevent 两种服务模式
+
+生成合成数据后分别以两种模式启动 serve.py，用 asyncio 客户端同时发起大量请求，
+比较吞吐量、p95 延迟和服务进程线程数。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.concurrency --concurrency 200 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import BACKEND_DIR, percentile
+
+
+def _prepare_database(scale):
+    workdir = tempfile.mkdtemp(prefix='meal-concurrency-')
+    database_url = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    script = (
+        'from app import app\n'
+        'from benchmarks.datagen import SyntheticDataGenerator\n'
+        'with app.app_context():\n'
+        f'    SyntheticDataGenerator(scale={scale}).generate()\n'
+    )
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=BACKEND_DIR)
+    subprocess.run([sys.executable, '-c', script], cwd=workdir, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return workdir, database_url
+
+
+async def _http(host, port, method, path, headers=None, body=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+             f'Content-Length: {len(payload)}']
+    if body is not None:
+        lines.append('Content-Type: application/json')
+    for key, value in (headers or {}).items():
+        lines.append(f'{key}: {value}')
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), content
+
+
+async def _wait_until_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await _http(host, port, 'GET', '/metrics')
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('Server did not start in time')
+
+
+async def _load(host, port, path, headers, concurrency, total, method='GET', body=None):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                status, _ = await _http(host, port, method, path, headers, body)
+                if status != 200:
+                    errors += 1
+            except OSError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'throughput_per_s': round(total / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'errors': errors
+    }
+
+
+def _thread_count(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+async def _run_mode(mode, port, workdir, database_url, args):
+    from benchmarks.datagen import BENCH_PASSWORD
+
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'serve.py'), '--mode', mode,
+                               '--host', '127.0.0.1', '--port', str(port)],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await _wait_until_ready('127.0.0.1', port)
+        _, content = await _http('127.0.0.1', port, 'POST', '/api/auth/login',
+                                 body={'username': 'bench_admin', 'password': BENCH_PASSWORD})
+        headers = {'Authorization': 'Bearer ' + json.loads(content)['access_token']}
+
+        results = {}
+        for name, path in (('menus_effective', '/api/menus/effective'),
+                           ('auth_me', '/api/auth/me'),
+                           ('events_poll_1s', '/api/events/poll?since=0&topics=stock&timeout=1')):
+            sampler = asyncio.ensure_future(_sample_threads(server.pid))
+            result = await _load('127.0.0.1', port, path, headers, args.concurrency, args.requests)
+            sampler.cancel()
+            result['peak_threads'] = await _peak(sampler)
+            results[name] = result
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def _sample_threads(pid):
+    peak = 0
+    try:
+        while True:
+            peak = max(peak, _thread_count(pid) or 0)
+            await asyncio.sleep(0.05)
+    except asyncio.CancelledError:
+        return peak
+
+
+async def _peak(task):
+    try:
+        return await task
+    except asyncio.CancelledError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Threaded vs gevent serving under concurrency')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args(argv)
+
+    workdir, database_url = _prepare_database(args.scale)
+    print(f"{'mode':<10}{'endpoint':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}{'threads':>9}")
+    for offset, mode in enumerate(('threaded', 'gevent')):
+        results = asyncio.run(_run_mode(mode, args.port + offset, workdir, database_url, args))
+        for name, r in results.items():
+            print(f"{mode:<10}{name:<18}{r['throughput_per_s']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+                  f"{r['errors']:>8}{r['peak_threads'] or '-':>9}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""基准测试用合成数据生成器
+
+按 scale 成比例生成全部业务模型的数据，使用固定随机种子保证可复现。
+客户及其订单、排餐、送餐、服务记录分布在多个站点；另生成月子餐计划模板和数据变更日志。
+指定 archive_days 时额外生成更早的历史数据，再用归档任务移入归档表（同时生成每日销量汇总和归档水位）。
+要求在空库上运行（显式指定主键，批量 INSERT 写入）。
+"""
+from extensions import db
+from models import (MenuCategory, Dish, Menu, MenuDish, DailyMenu, DailyMenuDish, Customer, User, BasicMenu,
+                    Supplier, Ingredient, IngredientPurchase, DishIngredient, CustomerOrder, OrderItem,
+                    MealSchedule, MealScheduleItem, ServiceCategory, ServiceItem, ServiceRecord, ServiceFeedback,
+                    ConfinementMealPlan, ConfinementWeekPlan, ConfinementDayPlan, ConfinementMealItem,
+                    ConfinementPlanTemplate, ConfinementPlanTemplateItem, WeChatUser, CustomerWeChat, DeliveryRecord,
+                    Site, ChangeLog, SalesDailyRollup, customer_order_archive, order_item_archive,
+                    delivery_record_archive, service_record_archive, service_feedback_archive)
+from sqlalchemy import select, func
+from werkzeug.security import generate_password_hash
+from datetime import datetime, date, timedelta
+import random
+
+CATEGORIES = ['早餐', '午餐', '晚餐', '加餐', '汤品']
+DISH_PREFIXES = ['红烧', '清蒸', '小炒', '清炖', '凉拌', '香煎', '白灼', '糖醋', '黄焖', '蒜蓉']
+DISH_MAINS = ['排骨', '鲈鱼', '鸡肉', '豆腐', '牛肉', '虾仁', '猪蹄', '青菜', '南瓜', '山药',
+              '木耳', '鸡蛋', '小米', '红枣', '银耳', '乌鸡', '鸽子', '莲藕', '冬瓜', '猪肝']
+INGREDIENTS = ['排骨', '鲈鱼', '鸡肉', '豆腐', '牛肉', '虾仁', '猪蹄', '青菜', '南瓜', '山药', '木耳', '鸡蛋',
+               '小米', '红枣', '银耳', '乌鸡', '鸽子', '莲藕', '冬瓜', '猪肝', '生姜', '枸杞', '黄芪', '当归',
+               '红糖', '黑芝麻', '核桃', '花生', '牛奶', '大米']
+RESTRICTIONS = ['海鲜', '辛辣', '生冷', '花生', '牛奶']
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高'
+GIVEN = '芳娜敏静丽艳娟霞秀英华慧玲红梅琳雪婷颖洁'
+STAFF_ROLES = ['nutritionist', 'chef', 'admin_staff', 'head_nurse', 'nurse', 'caregiver', 'delivery_staff']
+BENCH_PASSWORD = 'bench-password'
+
+
+def _rows(model, rows):
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+
+
+class SyntheticDataGenerator:
+    """合成数据生成器"""
+
+    def __init__(self, scale=1.0, history_days=90, seed=42, today=None, archive_days=0):
+        self.scale = scale
+        self.history_days = history_days
+        self.archive_days = archive_days
+        # 生成数据覆盖的总天数；早于 history_days 的部分最终进入归档表
+        self.span_days = history_days + archive_days
+        self.rng = random.Random(seed)
+        self.today = today or date.today()
+        self.counts = {}
+
+    def n(self, base):
+        return max(1, int(base * self.scale))
+
+    def _restrictions(self, probability):
+        if self.rng.random() >= probability:
+            return None
+        return ','.join(self.rng.sample(RESTRICTIONS, self.rng.randint(1, 2)))
+
+    def _insert(self, model, rows):
+        _rows(model, rows)
+        self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+
+    def generate(self):
+        """生成全部数据并提交，返回各表行数（归档后的在线表行数与归档表行数分别统计）"""
+        self._sites()
+        self._reference_data()
+        self._users()
+        self._customers()
+        self._menus()
+        self._orders_and_schedules()
+        self._services()
+        self._confinement_plans()
+        self._templates()
+        self._change_log()
+        self._wechat()
+        db.session.commit()
+        if self.archive_days:
+            self._archive()
+        return dict(self.counts)
+
+    def _sites(self):
+        self.site_ids = list(range(1, self.n(2) + 1))
+        self._insert(Site, [{'id': i, 'name': f'站点{i}', 'code': f'S{i:03d}', 'version': 1} for i in self.site_ids])
+
+    def _reference_data(self):
+        rng = self.rng
+        self.category_ids = list(range(1, len(CATEGORIES) + 1))
+        self._insert(MenuCategory, [{'id': i, 'name': name, 'version': 1}
+                                    for i, name in zip(self.category_ids, CATEGORIES)])
+
+        self.ingredient_ids = []
+        rows = []
+        for i in range(1, self.n(len(INGREDIENTS)) + 1):
+            base = INGREDIENTS[(i - 1) % len(INGREDIENTS)]
+            name = base if i <= len(INGREDIENTS) else f'{base}{i}'
+            rows.append({'id': i, 'name': name, 'stock': round(rng.uniform(0, 5000), 1), 'unit': 'g',
+                         'calorie': round(rng.uniform(20, 400), 1), 'shelf_life': rng.randint(2, 180),
+                         'version': 1})
+            self.ingredient_ids.append(i)
+        self._insert(Ingredient, rows)
+
+        self.dish_ids, self.dish_category, self.dish_price = [], {}, {}
+        rows = []
+        combos = [p + m for p in DISH_PREFIXES for m in DISH_MAINS]
+        for i in range(1, self.n(100) + 1):
+            name = combos[(i - 1) % len(combos)]
+            if i > len(combos):
+                name = f'{name}{i}'
+            category_id = rng.choice(self.category_ids)
+            rows.append({'id': i, 'name': name, 'category_id': category_id,
+                         'restrictions': self._restrictions(0.2), 'version': 1})
+            self.dish_ids.append(i)
+            self.dish_category[i] = category_id
+            self.dish_price[i] = round(rng.uniform(8, 88), 1)
+        self._insert(Dish, rows)
+
+        rows, next_id = [], 1
+        for dish_id in self.dish_ids:
+            for ingredient_id in rng.sample(self.ingredient_ids, min(3, len(self.ingredient_ids))):
+                rows.append({'id': next_id, 'dish_id': dish_id, 'ingredient_id': ingredient_id,
+                             'quantity': round(rng.uniform(10, 300), 1), 'unit': 'g', 'version': 1})
+                next_id += 1
+        self._insert(DishIngredient, rows)
+
+        supplier_ids = list(range(1, self.n(10) + 1))
+        self._insert(Supplier, [{'id': i, 'name': f'供应商{i}', 'contact_person': f'联系人{i}',
+                                 'phone': f'138{i:08d}', 'version': 1} for i in supplier_ids])
+
+        rows = []
+        start = datetime.combine(self.today - timedelta(days=self.span_days), datetime.min.time())
+        for i in range(1, self.n(self.span_days * 4) + 1):
+            quantity = round(rng.uniform(500, 20000), 1)
+            unit_price = round(rng.uniform(0.005, 0.2), 4)
+            rows.append({'id': i, 'site_id': rng.choice(self.site_ids), 'ingredient_id': rng.choice(self.ingredient_ids),
+                         'supplier_id': rng.choice(supplier_ids),
+                         'purchase_date': start + timedelta(hours=rng.randint(0, self.span_days * 24)),
+                         'quantity': quantity, 'unit_price': unit_price,
+                         'total_price': round(quantity * unit_price, 2), 'batch_number': f'B{i:06d}',
+                         'version': 1})
+        self._insert(IngredientPurchase, rows)
+
+        self._insert(ServiceCategory, [{'id': 1, 'name': '母婴护理', 'version': 1},
+                                       {'id': 2, 'name': '产后康复', 'version': 1}])
+        self.service_item_ids = list(range(1, 9))
+        self._insert(ServiceItem, [{'id': i, 'name': f'服务项目{i}', 'category_id': 1 + i % 2,
+                                    'duration': 30 + 15 * (i % 4), 'price': 100.0 + 20 * i, 'version': 1}
+                                   for i in self.service_item_ids])
+
+    def _users(self):
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+        rows = [{'id': 1, 'username': 'bench_admin', 'password_hash': password_hash, 'role': 'admin', 'version': 1}]
+        self.staff_by_role = {}
+        next_id = 2
+        for role in STAFF_ROLES:
+            for _ in range(self.n(3)):
+                rows.append({'id': next_id, 'username': f'{role}_{next_id}', 'password_hash': password_hash,
+                             'role': role, 'site_id': self.site_ids[next_id % len(self.site_ids)], 'version': 1})
+                self.staff_by_role.setdefault(role, []).append(next_id)
+                next_id += 1
+        self._insert(User, rows)
+
+    def _customers(self):
+        rng = self.rng
+        self.stays = {}
+        self.customer_site = {}
+        rows = []
+        for i in range(1, self.n(60 * self.span_days / self.history_days) + 1):
+            check_in = self.today - timedelta(days=rng.randint(-14, self.span_days + 30))
+            stay_days = rng.choice([28, 28, 35, 42])
+            self.stays[i] = (check_in, check_in + timedelta(days=stay_days))
+            self.customer_site[i] = self.site_ids[i % len(self.site_ids)]
+            rows.append({'id': i, 'site_id': self.customer_site[i], 'name': rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(GIVEN),
+                         'restrictions': self._restrictions(0.4), 'check_in_date': check_in,
+                         'check_out_date': check_in + timedelta(days=stay_days), 'stay_days': stay_days,
+                         'id_card_number': f'11010119900101{i:04d}', 'health_conditions': None, 'version': 1})
+        self._insert(Customer, rows)
+
+    def _in_house(self, day):
+        return [cid for cid, (start, end) in self.stays.items() if start <= day < end]
+
+    def _menus(self):
+        rng = self.rng
+        dishes_by_category = {}
+        for dish_id, category_id in self.dish_category.items():
+            dishes_by_category.setdefault(category_id, []).append(dish_id)
+        self.dishes_by_category = dishes_by_category
+
+        dish_names = {}
+        for row in db.session.query(Dish.id, Dish.name):
+            dish_names[row.id] = row.name
+
+        menus, menu_dishes, basic_menus = [], [], []
+        for week in range(1, 5):
+            menus.append({'id': week, 'name': f'第{week}周菜单', 'week_number': week, 'version': 1})
+            for day in range(1, 8):
+                for category_id in self.category_ids:
+                    choices = dishes_by_category.get(category_id)
+                    if not choices:
+                        continue
+                    dish_id = rng.choice(choices)
+                    menu_dishes.append({'id': len(menu_dishes) + 1, 'menu_id': week, 'dish_id': dish_id,
+                                        'day_of_week': day, 'category_id': category_id, 'version': 1})
+                    basic_menus.append({'id': len(basic_menus) + 1, 'week_number': week, 'day_of_week': day,
+                                        'category_id': category_id, 'dish_id': dish_id,
+                                        'dish_name': dish_names[dish_id], 'version': 1})
+        self._insert(Menu, menus)
+        self._insert(MenuDish, menu_dishes)
+        self._insert(BasicMenu, basic_menus)
+
+        daily_menus, daily_dishes = [], []
+        for offset in range(7):
+            daily_menus.append({'id': offset + 1, 'date': self.today + timedelta(days=offset), 'version': 1})
+            category_id = rng.choice(self.category_ids)
+            if dishes_by_category.get(category_id):
+                daily_dishes.append({'id': len(daily_dishes) + 1, 'daily_menu_id': offset + 1,
+                                     'dish_id': rng.choice(dishes_by_category[category_id]),
+                                     'category_id': category_id, 'quantity': 1, 'version': 1})
+        self._insert(DailyMenu, daily_menus)
+        self._insert(DailyMenuDish, daily_dishes)
+
+    def _orders_and_schedules(self):
+        rng = self.rng
+        orders, items, schedules, schedule_items, deliveries = [], [], [], [], []
+        delivery_staff = self.staff_by_role['delivery_staff']
+        for offset in range(self.span_days, -8, -1):
+            day = self.today - timedelta(days=offset)
+            schedule_ids = {}
+            for site_id in self.site_ids:
+                schedule_ids[site_id] = len(schedules) + 1
+                schedules.append({'id': schedule_ids[site_id], 'site_id': site_id, 'date': day,
+                                  'status': 'published' if offset > 0 else 'draft', 'version': 1})
+            for customer_id in self._in_house(day):
+                site_id = self.customer_site[customer_id]
+                schedule_id = schedule_ids[site_id]
+                for category_id in self.category_ids[:3]:
+                    choices = self.dishes_by_category.get(category_id)
+                    if not choices:
+                        continue
+                    item_id = len(schedule_items) + 1
+                    schedule_items.append({'id': item_id, 'site_id': site_id, 'schedule_id': schedule_id,
+                                           'customer_id': customer_id,
+                                           'dish_id': rng.choice(choices), 'category_id': category_id,
+                                           'quantity': 1, 'status': 'delivered' if offset > 0 else 'scheduled',
+                                           'version': 1})
+                    if offset > 0 and rng.random() < 0.5:
+                        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=7 + 5 * (category_id - 1))
+                        duration = rng.randint(5, 40)
+                        deliveries.append({'id': len(deliveries) + 1, 'site_id': site_id, 'customer_id': customer_id,
+                                           'delivery_staff_id': rng.choice(delivery_staff),
+                                           'meal_schedule_item_id': item_id, 'start_time': start,
+                                           'end_time': start + timedelta(minutes=duration), 'duration': duration,
+                                           'distance': round(rng.uniform(0.1, 3), 2), 'status': 'completed',
+                                           'version': 1})
+
+                if offset <= 0 or rng.random() > 0.7:
+                    continue
+                order_id = len(orders) + 1
+                total = 0
+                for dish_id in rng.sample(self.dish_ids, min(3, len(self.dish_ids))):
+                    quantity = rng.randint(1, 2)
+                    price = self.dish_price[dish_id]
+                    total += price * quantity
+                    items.append({'id': len(items) + 1, 'order_id': order_id, 'dish_id': dish_id,
+                                  'quantity': quantity, 'price': price, 'version': 1})
+                orders.append({'id': order_id, 'site_id': site_id, 'customer_id': customer_id, 'order_date': day,
+                               'status': 'completed', 'total_amount': round(total, 2), 'version': 1})
+
+        self._insert(MealSchedule, schedules)
+        self._insert(MealScheduleItem, schedule_items)
+        self._insert(CustomerOrder, orders)
+        self._insert(OrderItem, items)
+        self._insert(DeliveryRecord, deliveries)
+        self.orders = orders
+        self.delivered_items = [{'id': d['meal_schedule_item_id'], 'site_id': d['site_id'], 'delivered_at': d['end_time']}
+                                for d in deliveries]
+
+    def _services(self):
+        rng = self.rng
+        staff = self.staff_by_role['nurse'] + self.staff_by_role['caregiver']
+        records, feedbacks = [], []
+        for customer_id, (check_in, check_out) in self.stays.items():
+            for _ in range(rng.randint(2, 6)):
+                day = check_in + timedelta(days=rng.randint(0, max((check_out - check_in).days - 1, 0)))
+                if day > self.today:
+                    continue
+                start = datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(8, 18))
+                duration = rng.choice([30, 45, 60])
+                record_id = len(records) + 1
+                records.append({'id': record_id, 'site_id': self.customer_site[customer_id],
+                                'customer_id': customer_id,
+                                'service_item_id': rng.choice(self.service_item_ids),
+                                'staff_id': rng.choice(staff), 'start_time': start,
+                                'end_time': start + timedelta(minutes=duration), 'duration': duration,
+                                'status': 'completed', 'version': 1})
+                if rng.random() < 0.5:
+                    feedbacks.append({'id': len(feedbacks) + 1, 'service_record_id': record_id,
+                                      'customer_id': customer_id, 'rating': rng.randint(3, 5),
+                                      'comment': '满意', 'created_at': start + timedelta(hours=2), 'version': 1})
+        self._insert(ServiceRecord, records)
+        self._insert(ServiceFeedback, feedbacks)
+
+    def _confinement_plans(self):
+        rng = self.rng
+        plans, weeks, days, meal_items = [], [], [], []
+        for customer_id, (check_in, check_out) in self.stays.items():
+            if rng.random() < 0.5:
+                continue
+            plan_id = len(plans) + 1
+            total_weeks = (check_out - check_in).days // 7
+            plans.append({'id': plan_id, 'site_id': self.customer_site[customer_id], 'customer_id': customer_id,
+                          'start_date': check_in,
+                          'end_date': check_out - timedelta(days=1), 'status': 'active', 'type': 'inhouse',
+                          'version': 1})
+            for week in range(1, total_weeks + 1):
+                week_id = len(weeks) + 1
+                weeks.append({'id': week_id, 'meal_plan_id': plan_id, 'week_number': week, 'version': 1})
+                for day in range(1, 8):
+                    day_id = len(days) + 1
+                    days.append({'id': day_id, 'week_plan_id': week_id, 'day_of_week': day, 'version': 1})
+                    for category_id in self.category_ids:
+                        choices = self.dishes_by_category.get(category_id)
+                        if choices:
+                            meal_items.append({'id': len(meal_items) + 1, 'day_plan_id': day_id,
+                                               'category_id': category_id, 'dish_id': rng.choice(choices),
+                                               'version': 1})
+        self._insert(ConfinementMealPlan, plans)
+        self._insert(ConfinementWeekPlan, weeks)
+        self._insert(ConfinementDayPlan, days)
+        self._insert(ConfinementMealItem, meal_items)
+
+    def _templates(self):
+        rng = self.rng
+        templates, items = [], []
+        for template_id in range(1, self.n(3) + 1):
+            templates.append({'id': template_id, 'name': f'标准{template_id}号模板', 'weeks': 4, 'type': 'inhouse',
+                              'created_by': 1, 'version': 1})
+            for week in range(1, 5):
+                for day in range(1, 8):
+                    for category_id in self.category_ids:
+                        choices = self.dishes_by_category.get(category_id)
+                        if choices:
+                            items.append({'id': len(items) + 1, 'template_id': template_id, 'week_number': week,
+                                          'day_of_week': day, 'category_id': category_id,
+                                          'dish_id': rng.choice(choices), 'version': 1})
+        self._insert(ConfinementPlanTemplate, templates)
+        self._insert(ConfinementPlanTemplateItem, items)
+
+    def _change_log(self):
+        """批量 INSERT 不经过变更捕获，按订单创建、排餐明细送达生成对应的变更日志"""
+        rng = self.rng
+        staff = [user_id for ids in self.staff_by_role.values() for user_id in ids]
+        rows = []
+        for order in self.orders:
+            rows.append({'table_name': 'customer_order', 'row_id': order['id'], 'op': 'insert', 'version': 1,
+                         'changes': {'customer_id': order['customer_id'], 'status': order['status'],
+                                     'total_amount': order['total_amount']},
+                         'user_id': rng.choice(staff), 'site_id': order['site_id'],
+                         'created_at': datetime.combine(order['order_date'], datetime.min.time())
+                         + timedelta(hours=rng.randint(6, 20))})
+        for item in self.delivered_items:
+            rows.append({'table_name': 'meal_schedule_item', 'row_id': item['id'], 'op': 'update', 'version': 1,
+                         'changes': {'status': ['scheduled', 'delivered']},
+                         'user_id': rng.choice(self.staff_by_role['delivery_staff']), 'site_id': item['site_id'],
+                         'created_at': item['delivered_at']})
+        rows.sort(key=lambda row: row['created_at'])
+        for i, row in enumerate(rows, 1):
+            row['id'] = i
+        self._insert(ChangeLog, rows)
+
+    def _archive(self):
+        from utils.archive import archiver
+
+        archiver.run(days=self.history_days)
+        for table in (customer_order_archive, order_item_archive, delivery_record_archive,
+                      service_record_archive, service_feedback_archive, SalesDailyRollup.__table__):
+            rows = db.session.execute(select(func.count()).select_from(table)).scalar()
+            hot = table.name[:-len('_archive')]
+            if hot in self.counts:
+                self.counts[hot] -= rows
+            self.counts[table.name] = rows
+
+    def _wechat(self):
+        wechat_users, links = [], []
+        for customer_id in self.stays:
+            wechat_id = len(wechat_users) + 1
+            wechat_users.append({'id': wechat_id, 'openid': f'bench-openid-{customer_id:06d}',
+                                 'nickname': f'用户{customer_id}', 'version': 1})
+            links.append({'id': wechat_id, 'customer_id': customer_id, 'wechat_user_id': wechat_id, 'version': 1})
+        self._insert(WeChatUser, wechat_users)
+        self._insert(CustomerWeChat, links)
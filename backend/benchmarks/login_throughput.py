@@ -0,0 +1,68 @@
+"""登录吞吐量：密码哈希在请求线程内同步计算 vs 在进程池中计算
+
+以 threaded 模式启动 serve.py，并发压测 /api/auth/login，同时以少量并发请求一个轻量接口，
+观察登录高峰期间其他接口的延迟（进程池模式下 errors 含排队已满时返回的 503）；最后压测 /api/auth/refresh（刷新令牌续期，无需密码哈希）。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.login_throughput --concurrency 50 --requests 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run_benchmarks import BACKEND_DIR
+from benchmarks.concurrency import _prepare_database, _http, _wait_until_ready, _load
+
+
+async def _run(workers, port, workdir, database_url, args):
+    from benchmarks.datagen import BENCH_PASSWORD
+
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=BACKEND_DIR, PASSWORD_HASH_WORKERS=str(workers))
+    server = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'serve.py'), '--mode', 'threaded',
+                               '--host', '127.0.0.1', '--port', str(port)],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    host = '127.0.0.1'
+    credentials = {'username': 'bench_admin', 'password': BENCH_PASSWORD}
+    try:
+        await _wait_until_ready(host, port)
+        _, content = await _http(host, port, 'POST', '/api/auth/login', body=credentials)
+        tokens = json.loads(content)
+        access = {'Authorization': 'Bearer ' + tokens['access_token']}
+        refresh = {'Authorization': 'Bearer ' + tokens['refresh_token']}
+
+        background = asyncio.ensure_future(
+            _load(host, port, '/api/auth/me', access, 4, args.requests))
+        login = await _load(host, port, '/api/auth/login', {}, args.concurrency, args.requests,
+                            method='POST', body=credentials)
+        background = await background
+        renew = await _load(host, port, '/api/auth/refresh', refresh, args.concurrency, args.requests,
+                            method='POST')
+        return {'login': login, 'auth_me_during_login': background, 'refresh': renew}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Login throughput with inline vs pooled password hashing')
+    parser.add_argument('--scale', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    parser.add_argument('--port', type=int, default=5199)
+    args = parser.parse_args(argv)
+
+    workdir, database_url = _prepare_database(args.scale)
+    print(f"{'hashing':<12}{'endpoint':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for offset, (label, workers) in enumerate((('inline', 0), (f'pool({args.workers})', args.workers))):
+        results = asyncio.run(_run(workers, args.port + offset, workdir, database_url, args))
+        for name, r in results.items():
+            print(f"{label:<12}{name:<22}{r['throughput_per_s']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['errors']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""性能基准测试
+
+在临时 SQLite 库上生成合成数据（多站点，含归档数据与变更日志），依次压测认证流程、查询接口和全部 AIAnalyzer 分析，
+输出吞吐量、p95 延迟、每次操作的SQL语句数和峰值内存，并与 benchmarks/baseline.json 比较。
+任一场景每次操作的SQL语句数超过 QUERY_BUDGET 或超过基线、基线缺失或基线的数据参数与本次运行不一致时返回非零退出码；
+p95 延迟与基线的比较只输出提示，不影响退出码。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.run_benchmarks                      # 与基线比较
+    python -m benchmarks.run_benchmarks --save-baseline      # 重新记录基线（数据生成或查询变化后）
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, 'benchmarks', 'baseline.json')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _setup(scale, history_days, seed, archive_days):
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    workdir = tempfile.mkdtemp(prefix='meal-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.chdir(workdir)
+
+    from app import app
+    from extensions import db
+    from benchmarks.datagen import SyntheticDataGenerator
+
+    with app.app_context():
+        started = time.perf_counter()
+        counts = SyntheticDataGenerator(scale=scale, history_days=history_days, seed=seed,
+                                        archive_days=archive_days).generate()
+        print(f'Generated {sum(counts.values())} rows in {time.perf_counter() - started:.2f}s')
+        for table, count in sorted(counts.items()):
+            print(f'  {table:<28}{count:>10}')
+        db.session.remove()
+    return app
+
+
+def _http_scenarios(app):
+    from benchmarks.datagen import BENCH_PASSWORD
+    from utils.instrumentation import collect_queries
+
+    client = app.test_client()
+    login = client.post('/api/auth/login', json={'username': 'bench_admin', 'password': BENCH_PASSWORD})
+    token = login.get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    today = date.today()
+    week_later = today + timedelta(days=6)
+
+    def get(url, site_id=None):
+        request_headers = dict(headers, **({'X-Site-Id': str(site_id)} if site_id else {}))
+
+        def run():
+            # 读完响应体：流式响应（导出）的查询在读取时才执行，不计入 X-Query-Count
+            with collect_queries() as collector:
+                response = client.get(url, headers=request_headers)
+                body = response.get_data()
+            assert response.status_code == 200, (url, response.status_code, body[:200])
+            return collector.count
+        return run
+
+    def login_run():
+        response = client.post('/api/auth/login', json={'username': 'bench_admin', 'password': BENCH_PASSWORD})
+        assert response.status_code == 200
+        return int(response.headers.get('X-Query-Count', 0))
+
+    return [
+        ('auth_login', login_run, 5),
+        ('auth_me', get('/api/auth/me'), None),
+        ('search_typeahead', get('/api/search/typeahead?type=dish&q=hs'), None),
+        ('customer_occupancy', get(f'/api/customers/occupancy?date={today}'), None),
+        ('customer_occupancy_calendar', get(f'/api/customers/occupancy/calendar?month={today:%Y-%m}'), None),
+        ('menus_effective', get(f'/api/menus/effective?start_date={today}&end_date={week_later}'), None),
+        ('confinement_templates', get('/api/confinement-templates'), None),
+        ('ai_sales_forecast', get('/api/ai/sales-forecast'), 5),
+        ('export_orders_csv', get('/api/exports/orders'), 10),
+        ('export_orders_csv_site', get('/api/exports/orders', site_id=1), 10),
+        ('export_orders_csv_30d', get(f'/api/exports/orders?start_date={today - timedelta(days=30)}'), 10),
+        ('audit_changes', get('/api/audit/changes?limit=500'), None),
+        ('audit_changes_site', get('/api/audit/changes?limit=500', site_id=1), None),
+    ]
+
+
+def _analyzer_scenarios(app):
+    from extensions import db
+    from utils.ai_analyzer import AIAnalyzer
+    from utils.instrumentation import collect_queries
+
+    def analysis(method_name):
+        def run():
+            with app.app_context():
+                with collect_queries() as collector:
+                    getattr(AIAnalyzer(), method_name)()
+                db.session.remove()
+            return collector.count
+        return run
+
+    def reconcile():
+        from utils.order_pricing import reconcile_order_totals
+        with app.app_context():
+            with collect_queries() as collector:
+                reconcile_order_totals()
+            db.session.rollback()
+            db.session.remove()
+        return collector.count
+
+    def restriction_audit():
+        from utils.restriction_audit import audit_restrictions
+        with app.app_context():
+            with collect_queries() as collector:
+                audit_restrictions(date.today() - timedelta(days=30), date.today())
+            db.session.remove()
+        return collector.count
+
+    return [(f'ai_{name}', analysis(name), 3) for name in (
+        'analyze_dish_quality', 'analyze_cost_effectiveness', 'analyze_sales_performance',
+        'analyze_nutritional_balance', 'forecast_sales'
+    )] + [('reconcile_order_totals', reconcile, 3), ('restriction_audit_30d', restriction_audit, 10)]
+
+
+def _write_scenarios(app):
+    """批量写入排餐明细、订单（事务回滚，不改变数据），衡量索引维护成本"""
+    from extensions import db
+    from models import Customer, Dish, MealSchedule, MealScheduleItem, CustomerOrder
+    from utils.instrumentation import collect_queries
+
+    with app.app_context():
+        customer_ids = [c for (c,) in db.session.query(Customer.id).limit(50)]
+        dish_ids = [(d, c) for d, c in db.session.query(Dish.id, Dish.category_id).limit(20)]
+        schedule = db.session.query(MealSchedule.id, MealSchedule.site_id).first()
+        db.session.remove()
+
+    schedule_items = [{
+        'site_id': schedule.site_id, 'schedule_id': schedule.id, 'customer_id': customer_ids[i % len(customer_ids)],
+        'dish_id': dish_ids[i % len(dish_ids)][0], 'category_id': dish_ids[i % len(dish_ids)][1],
+        'quantity': 1, 'status': 'scheduled', 'version': 1
+    } for i in range(1000)]
+    orders = [{
+        'site_id': schedule.site_id, 'customer_id': customer_ids[i % len(customer_ids)],
+        'order_date': date.today() - timedelta(days=i % 30), 'status': 'pending', 'total_amount': 0, 'version': 1
+    } for i in range(1000)]
+
+    def insert(table, rows):
+        def run():
+            with app.app_context():
+                with collect_queries() as collector:
+                    db.session.execute(table.insert(), rows)
+                db.session.rollback()
+                db.session.remove()
+            return collector.count
+        return run
+
+    return [
+        ('insert_schedule_items_1000', insert(MealScheduleItem.__table__, schedule_items), 10),
+        ('insert_orders_1000', insert(CustomerOrder.__table__, orders), 10),
+    ]
+
+
+def _measure(run, iterations):
+    run()
+    latencies, queries = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        queries.append(run())
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'throughput_per_s': round(iterations / total, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'queries_per_op': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def compare(results, baseline, tolerance, noise_floor_ms=1.0):
+    """返回 (退化项, 耗时提示)：SQL语句数增加为退化；p95 超过基线 (1 + tolerance) 倍且超出噪声下限仅作提示
+
+    语句数在固定数据和种子下是确定的，耗时受机器负载影响，不作为失败条件
+    """
+    regressions, slowdowns = [], []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['queries_per_op'] > base['queries_per_op']:
+            regressions.append(f"{name}: queries {base['queries_per_op']} -> {result['queries_per_op']}")
+        if (result['p95_ms'] > base['p95_ms'] * (1 + tolerance)
+                and result['p95_ms'] - base['p95_ms'] > noise_floor_ms):
+            slowdowns.append(f"{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+    return regressions, slowdowns
+
+
+def over_budget(results, budget):
+    """返回每次操作的SQL语句数超过 QUERY_BUDGET 的场景"""
+    if budget is None:
+        return []
+    return [f"{name}: queries {result['queries_per_op']} > {budget}"
+            for name, result in results.items() if result['queries_per_op'] > budget]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Meal management system benchmarks')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--history-days', type=int, default=90)
+    parser.add_argument('--archive-days', type=int, default=60, help='额外生成并归档的更早历史天数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--only', help='Comma separated scenario names')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='p95 相对基线的提示阈值，不影响退出码')
+    args = parser.parse_args(argv)
+
+    app = _setup(args.scale, args.history_days, args.seed, args.archive_days)
+    scenarios = _http_scenarios(app) + _analyzer_scenarios(app) + _write_scenarios(app)
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [s for s in scenarios if s[0] in wanted]
+
+    results = {}
+    print(f"\n{'scenario':<34}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}")
+    for name, run, iterations in scenarios:
+        result = _measure(run, min(iterations or args.iterations, args.iterations))
+        results[name] = result
+        print(f"{name:<34}{result['throughput_per_s']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['queries_per_op']:>9}{result['peak_memory_kb']:>10}")
+
+    exceeded = over_budget(results, app.config.get('QUERY_BUDGET'))
+    if exceeded:
+        print('\nQuery budget exceeded:')
+        for line in exceeded:
+            print(f'  {line}')
+        return 1
+
+    meta = {'scale': args.scale, 'history_days': args.history_days, 'archive_days': args.archive_days,
+            'seed': args.seed}
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'\nBaseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline found at {args.baseline}, run with --save-baseline first')
+        return 2
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('meta') != meta:
+        print(f"\nBaseline was recorded with {baseline.get('meta')}, current run uses {meta}")
+        return 2
+
+    missing = sorted(set(results) - set(baseline['results']))
+    if missing and not args.only:
+        print(f"\nScenarios missing from baseline: {', '.join(missing)}; run with --save-baseline")
+        return 2
+
+    regressions, slowdowns = compare(results, baseline['results'], args.tolerance)
+    if slowdowns:
+        print(f'\nSlower than baseline by more than {args.tolerance:.0%} (advisory, timings depend on the machine):')
+        for line in slowdowns:
+            print(f'  {line}')
+    if regressions:
+        print('\nRegressions:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print('\nNo query count regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,33 @@
 import os
+from datetime import date, timedelta
 
 SQLALCHEMY_DATABASE_URI = 'sqlite:///meal_management.db'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 JWT_SECRET_KEY = 'your-secret-key-here'
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+MENU_ROTATION_START = date(2024, 1, 1)
+MENU_CACHE_CHECK_SECONDS = 5
+REFERENCE_DATA_CHECK_SECONDS = 5
+QUERY_BUDGET = 50
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+IMAGE_FOLDER = os.path.join(UPLOAD_FOLDER, 'images')
+IMAGE_THUMBNAIL_SIZES = {'thumb': 160, 'medium': 640}
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_URL_MAX_AGE = 300
+ARCHIVE_HORIZON_DAYS = 180
+ARCHIVE_BATCH_SIZE = 5000
+CHANGE_LOG_ENABLED = True
+WECHAT_APPID = os.environ.get('WECHAT_APPID')
+WECHAT_SECRET = os.environ.get('WECHAT_SECRET')
+WECHAT_DEV_LOGIN = False
+WECHAT_SESSION_CACHE_SIZE = 10000
+WECHAT_SESSION_CACHE_TTL = 60
+JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
+JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 2) // 2, 1)))
+PASSWORD_HASH_MAX_PENDING = PASSWORD_HASH_WORKERS * 4
+PASSWORD_HASH_QUEUE_TIMEOUT = 2
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from extensions import db
 from datetime import datetime
+from sqlalchemy.ext.declarative import declared_attr
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class BaseModel(db.Model):
@@ -7,6 +8,28 @@ class BaseModel(db.Model):
     __abstract__ = True
     id = db.Column(db.Integer, primary_key=True)
     version = db.Column(db.Integer, default=0, nullable=False)
+    
+    @declared_attr
+    def __mapper_args__(cls):
+        return {'version_id_col': cls.version}
+
+class SiteScopedMixin:
+    """按站点（月子中心）隔离的数据，查询时按当前用户所属站点自动过滤（见 utils/tenancy.py）"""
+    
+    @declared_attr
+    def site_id(cls):
+        # 不单独建索引：各站点表都有以 site_id 开头的复合索引
+        return db.Column(db.Integer, db.ForeignKey('site.id'))
+
+class Site(BaseModel):
+    """站点（月子中心）模型"""
+    __tablename__ = 'site'
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    code = db.Column(db.String(20), nullable=False, unique=True, index=True)
+    address = db.Column(db.String(200))
+    
+    def __repr__(self):
+        return f'<Site {self.code}>'
 
 class MenuCategory(BaseModel):
     """菜单分类模型"""
@@ -42,9 +65,12 @@ class Menu(BaseModel):
 class MenuDish(BaseModel):
     """菜单与菜品的关联模型"""
     __tablename__ = 'menu_dish'
-    menu_id = db.Column(db.Integer, db.ForeignKey('menu.id'), nullable=False, index=True)
+    __table_args__ = (
+        db.Index('ix_menu_dish_menu_day', 'menu_id', 'day_of_week'),
+    )
+    menu_id = db.Column(db.Integer, db.ForeignKey('menu.id'), nullable=False)
     dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False, index=True)
-    day_of_week = db.Column(db.Integer, nullable=False, index=True)
+    day_of_week = db.Column(db.Integer, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('menu_category.id'), nullable=False, index=True)
     
     menu = db.relationship('Menu', backref=db.backref('menu_dishes', lazy=True))
@@ -72,9 +98,13 @@ class DailyMenuDish(BaseModel):
     dish = db.relationship('Dish', backref=db.backref('daily_menu_dishes', lazy=True))
     category = db.relationship('MenuCategory', backref=db.backref('daily_menu_dishes', lazy=True))
 
-class Customer(BaseModel):
+class Customer(SiteScopedMixin, BaseModel):
     """客户模型"""
     __tablename__ = 'customer'
+    __table_args__ = (
+        db.Index('ix_customer_site_name', 'site_id', 'name'),
+        db.Index('ix_customer_site_check_in', 'site_id', 'check_in_date'),
+    )
     name = db.Column(db.String(100), nullable=False, index=True)
     restrictions = db.Column(db.String(500))
     check_in_date = db.Column(db.Date, index=True)
@@ -93,7 +123,7 @@ class CustomerMenu(BaseModel):
     __tablename__ = 'customer_menu'
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
     daily_menu_id = db.Column(db.Integer, db.ForeignKey('daily_menu.id'), nullable=False, index=True)
-    status = db.Column(db.String(20), default='pending', index=True)
+    status = db.Column(db.String(20), default='pending')
     
     customer = db.relationship('Customer', backref=db.backref('customer_menus', lazy=True))
     daily_menu = db.relationship('DailyMenu', backref=db.backref('customer_menus', lazy=True))
@@ -103,7 +133,10 @@ class User(BaseModel):
     __tablename__ = 'user'
     username = db.Column(db.String(100), nullable=False, unique=True, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), default='user', index=True)
+    role = db.Column(db.String(20), default='user')
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), index=True)
+    
+    site = db.relationship('Site', backref=db.backref('users', lazy=True))
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -132,7 +165,7 @@ class Ingredient(BaseModel):
     __tablename__ = 'ingredient'
     name = db.Column(db.String(100), nullable=False, unique=True, index=True)
     description = db.Column(db.String(200))
-    stock = db.Column(db.Float, default=0, index=True)
+    stock = db.Column(db.Float, default=0)
     unit = db.Column(db.String(20), default='g')
     nutrition_info = db.Column(db.JSON)
     calorie = db.Column(db.Float)
@@ -142,9 +175,12 @@ class Ingredient(BaseModel):
     def __repr__(self):
         return f'<Ingredient {self.name}>'
 
-class IngredientPurchase(BaseModel):
+class IngredientPurchase(SiteScopedMixin, BaseModel):
     """食材采购记录模型"""
     __tablename__ = 'ingredient_purchase'
+    __table_args__ = (
+        db.Index('ix_ingredient_purchase_site_date', 'site_id', 'purchase_date'),
+    )
     ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), nullable=False, index=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=False, index=True)
     purchase_date = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
@@ -174,12 +210,16 @@ class DishIngredient(BaseModel):
     dish = db.relationship('Dish', backref=db.backref('dish_ingredients', lazy=True))
     ingredient = db.relationship('Ingredient', backref=db.backref('dish_ingredients', lazy=True))
 
-class CustomerOrder(BaseModel):
+class CustomerOrder(SiteScopedMixin, BaseModel):
     """客户订单模型"""
     __tablename__ = 'customer_order'
-    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
+    __table_args__ = (
+        db.Index('ix_customer_order_site_date', 'site_id', 'order_date'),
+        db.Index('ix_customer_order_customer_date', 'customer_id', 'order_date'),
+    )
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     order_date = db.Column(db.Date, nullable=False, default=datetime.now().date(), index=True)
-    status = db.Column(db.String(20), default='pending', index=True)
+    status = db.Column(db.String(20), default='pending')
     total_amount = db.Column(db.Float, default=0)
     
     customer = db.relationship('Customer', backref=db.backref('customer_orders', lazy=True))
@@ -195,25 +235,33 @@ class OrderItem(BaseModel):
     order = db.relationship('CustomerOrder', backref=db.backref('order_items', lazy=True))
     dish = db.relationship('Dish', backref=db.backref('order_items', lazy=True))
 
-class MealSchedule(BaseModel):
+class MealSchedule(SiteScopedMixin, BaseModel):
     """排餐表模型"""
     __tablename__ = 'meal_schedule'
-    date = db.Column(db.Date, nullable=False, unique=True, index=True)
+    date = db.Column(db.Date, nullable=False, index=True)
     description = db.Column(db.String(200))
-    status = db.Column(db.String(20), default='draft', index=True)
+    status = db.Column(db.String(20), default='draft')
     
     def __repr__(self):
         return f'<MealSchedule {self.date}>'
 
-class MealScheduleItem(BaseModel):
+# 每个站点每天一张排餐表；site_id 为空（总部/单站点）的排餐表之间同样按日期唯一，
+# 普通的 (site_id, date) 唯一约束对 NULL 不生效，因此按 coalesce(site_id, 0) 建函数索引（MySQL 需 8.0.13+）
+db.Index('uq_meal_schedule_date_per_site', db.func.coalesce(MealSchedule.site_id, 0), MealSchedule.date, unique=True)
+
+class MealScheduleItem(SiteScopedMixin, BaseModel):
     """排餐表详情模型"""
     __tablename__ = 'meal_schedule_item'
-    schedule_id = db.Column(db.Integer, db.ForeignKey('meal_schedule.id'), nullable=False, index=True)
+    __table_args__ = (
+        db.Index('ix_meal_schedule_item_site_schedule', 'site_id', 'schedule_id'),
+        db.Index('ix_meal_schedule_item_schedule_customer', 'schedule_id', 'customer_id'),
+    )
+    schedule_id = db.Column(db.Integer, db.ForeignKey('meal_schedule.id'), nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
     dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False, index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('menu_category.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, default=1)
-    status = db.Column(db.String(20), default='scheduled', index=True)
+    status = db.Column(db.String(20), default='scheduled')
     
     schedule = db.relationship('MealSchedule', backref=db.backref('schedule_items', lazy=True))
     customer = db.relationship('Customer', backref=db.backref('schedule_items', lazy=True))
@@ -223,13 +271,16 @@ class MealScheduleItem(BaseModel):
 class BasicMenu(BaseModel):
     """基础餐单模型"""
     __tablename__ = 'basic_menu'
-    week_number = db.Column(db.Integer, nullable=False, index=True)
-    day_of_week = db.Column(db.Integer, nullable=False, index=True)
+    __table_args__ = (
+        db.Index('ix_basic_menu_slot', 'week_number', 'day_of_week', 'category_id'),
+    )
+    week_number = db.Column(db.Integer, nullable=False)
+    day_of_week = db.Column(db.Integer, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('menu_category.id'), nullable=False, index=True)
     dish_name = db.Column(db.String(100), nullable=False, index=True)
     dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), index=True)
-    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
-    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
     category = db.relationship('MenuCategory', backref=db.backref('basic_menus', lazy=True))
     dish = db.relationship('Dish', backref=db.backref('basic_menus', lazy=True))
@@ -260,16 +311,20 @@ class ServiceItem(BaseModel):
     def __repr__(self):
         return f'<ServiceItem {self.name}>'
 
-class ServiceRecord(BaseModel):
+class ServiceRecord(SiteScopedMixin, BaseModel):
     """服务记录模型"""
     __tablename__ = 'service_record'
+    __table_args__ = (
+        db.Index('ix_service_record_site_start', 'site_id', 'start_time'),
+        db.Index('ix_service_record_staff_start', 'staff_id', 'start_time'),
+    )
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
     service_item_id = db.Column(db.Integer, db.ForeignKey('service_item.id'), nullable=False, index=True)
-    staff_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, index=True)
-    end_time = db.Column(db.DateTime, index=True)
+    end_time = db.Column(db.DateTime)
     duration = db.Column(db.Integer)
-    status = db.Column(db.String(20), default='scheduled', index=True)
+    status = db.Column(db.String(20), default='scheduled')
     notes = db.Column(db.String(500))
     
     customer = db.relationship('Customer', backref=db.backref('service_records', lazy=True))
@@ -294,14 +349,17 @@ class ServiceFeedback(BaseModel):
     def __repr__(self):
         return f'<ServiceFeedback Record:{self.service_record_id} Rating:{self.rating}>'
 
-class ConfinementMealPlan(BaseModel):
+class ConfinementMealPlan(SiteScopedMixin, BaseModel):
     """月子餐计划模型"""
     __tablename__ = 'confinement_meal_plan'
+    __table_args__ = (
+        db.Index('ix_confinement_meal_plan_site_start', 'site_id', 'start_date'),
+    )
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, unique=True, index=True)
     start_date = db.Column(db.Date, nullable=False, index=True)
     end_date = db.Column(db.Date, index=True)
-    status = db.Column(db.String(20), default='active', index=True)
-    type = db.Column(db.String(20), default='inhouse', index=True)
+    status = db.Column(db.String(20), default='active')
+    type = db.Column(db.String(20), default='inhouse')
     
     customer = db.relationship('Customer', backref=db.backref('confinement_meal_plan', uselist=False, lazy=True))
     
@@ -311,8 +369,11 @@ class ConfinementMealPlan(BaseModel):
 class ConfinementWeekPlan(BaseModel):
     """月子餐周计划模型"""
     __tablename__ = 'confinement_week_plan'
-    meal_plan_id = db.Column(db.Integer, db.ForeignKey('confinement_meal_plan.id'), nullable=False, index=True)
-    week_number = db.Column(db.Integer, nullable=False, index=True)
+    __table_args__ = (
+        db.Index('ix_confinement_week_plan_plan_week', 'meal_plan_id', 'week_number'),
+    )
+    meal_plan_id = db.Column(db.Integer, db.ForeignKey('confinement_meal_plan.id'), nullable=False)
+    week_number = db.Column(db.Integer, nullable=False)
     
     meal_plan = db.relationship('ConfinementMealPlan', backref=db.backref('week_plans', lazy=True))
     
@@ -322,8 +383,11 @@ class ConfinementWeekPlan(BaseModel):
 class ConfinementDayPlan(BaseModel):
     """月子餐日计划模型"""
     __tablename__ = 'confinement_day_plan'
-    week_plan_id = db.Column(db.Integer, db.ForeignKey('confinement_week_plan.id'), nullable=False, index=True)
-    day_of_week = db.Column(db.Integer, nullable=False, index=True)
+    __table_args__ = (
+        db.Index('ix_confinement_day_plan_week_day', 'week_plan_id', 'day_of_week'),
+    )
+    week_plan_id = db.Column(db.Integer, db.ForeignKey('confinement_week_plan.id'), nullable=False)
+    day_of_week = db.Column(db.Integer, nullable=False)
     
     week_plan = db.relationship('ConfinementWeekPlan', backref=db.backref('day_plans', lazy=True))
     
@@ -344,6 +408,37 @@ class ConfinementMealItem(BaseModel):
     def __repr__(self):
         return f'<ConfinementMealItem Day:{self.day_plan_id} Category:{self.category_id} Dish:{self.dish_id}>'
 
+class ConfinementPlanTemplate(BaseModel):
+    """月子餐计划模板模型"""
+    __tablename__ = 'confinement_plan_template'
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)
+    description = db.Column(db.String(200))
+    weeks = db.Column(db.Integer, nullable=False, default=4)
+    type = db.Column(db.String(20), default='inhouse')
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+    
+    creator = db.relationship('User', backref=db.backref('confinement_plan_templates', lazy=True))
+    
+    def __repr__(self):
+        return f'<ConfinementPlanTemplate {self.name}>'
+
+class ConfinementPlanTemplateItem(BaseModel):
+    """月子餐计划模板单项模型"""
+    __tablename__ = 'confinement_plan_template_item'
+    template_id = db.Column(db.Integer, db.ForeignKey('confinement_plan_template.id'), nullable=False, index=True)
+    week_number = db.Column(db.Integer, nullable=False)
+    day_of_week = db.Column(db.Integer, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('menu_category.id'), nullable=False)
+    dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False)
+    
+    template = db.relationship('ConfinementPlanTemplate', backref=db.backref('items', lazy=True))
+    category = db.relationship('MenuCategory')
+    dish = db.relationship('Dish')
+    
+    def __repr__(self):
+        return f'<ConfinementPlanTemplateItem Template:{self.template_id} Week:{self.week_number} Day:{self.day_of_week}>'
+
 class WeChatUser(BaseModel):
     """微信用户模型"""
     __tablename__ = 'wechat_user'
@@ -368,18 +463,22 @@ class CustomerWeChat(BaseModel):
     def __repr__(self):
         return f'<CustomerWeChat Customer:{self.customer_id} WeChat:{self.wechat_user_id}>'
 
-class DeliveryRecord(BaseModel):
+class DeliveryRecord(SiteScopedMixin, BaseModel):
     """送餐记录模型"""
     __tablename__ = 'delivery_record'
+    __table_args__ = (
+        db.Index('ix_delivery_record_site_start', 'site_id', 'start_time'),
+        db.Index('ix_delivery_record_staff_start', 'delivery_staff_id', 'start_time'),
+    )
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
-    delivery_staff_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    delivery_staff_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     order_id = db.Column(db.Integer, db.ForeignKey('customer_order.id'), index=True)
     meal_schedule_item_id = db.Column(db.Integer, db.ForeignKey('meal_schedule_item.id'), index=True)
     start_time = db.Column(db.DateTime, nullable=False, index=True)
-    end_time = db.Column(db.DateTime, index=True)
+    end_time = db.Column(db.DateTime)
     duration = db.Column(db.Integer)
     distance = db.Column(db.Float)
-    status = db.Column(db.String(20), default='pending', index=True)
+    status = db.Column(db.String(20), default='pending')
     notes = db.Column(db.String(500))
     
     customer = db.relationship('Customer', backref=db.backref('delivery_records', lazy=True))
@@ -400,4 +499,72 @@ class AIAnalysisResult(BaseModel):
     created_at = db.Column(db.DateTime, default=datetime.now, index=True)
     
     def __repr__(self):
-        return f'<AIAnalysisResult Type:{self.analysis_type}>'
\ No newline at end of file
+        return f'<AIAnalysisResult Type:{self.analysis_type}>'
+
+class SalesDailyRollup(SiteScopedMixin, BaseModel):
+    """已归档订单的每日菜品销量汇总（归档时生成，供分析使用）"""
+    __tablename__ = 'sales_daily_rollup'
+    __table_args__ = (
+        db.Index('ix_sales_daily_rollup_site_date', 'site_id', 'date'),
+    )
+    date = db.Column(db.Date, nullable=False, index=True)
+    dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+class ArchiveWatermark(BaseModel):
+    """归档水位：早于 archived_before 的已关闭记录已移入归档表"""
+    __tablename__ = 'archive_watermark'
+    table_name = db.Column(db.String(50), nullable=False, unique=True)
+    archived_before = db.Column(db.Date, nullable=False)
+    archived_rows = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<ArchiveWatermark {self.table_name} < {self.archived_before}>'
+
+class ChangeLog(db.Model):
+    """数据变更日志（只追加）：记录 BaseModel 子类的新增、修改、删除"""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_table_row', 'table_name', 'row_id'),
+    )
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    version = db.Column(db.Integer)
+    changes = db.Column(db.JSON)
+    user_id = db.Column(db.Integer, index=True)
+    site_id = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.op} {self.table_name}:{self.row_id}>'
+
+class ChangeLogCursor(db.Model):
+    """变更日志消费者游标"""
+    __tablename__ = 'change_log_cursor'
+    consumer = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+def _archive_table(model, *indexes):
+    """归档表：与在线表同列（不含外键与在线索引），仅保留按站点、日期查询的索引"""
+    columns = [db.Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False)
+               for c in model.__table__.columns]
+    return db.Table(f'{model.__tablename__}_archive', *columns, *indexes)
+
+customer_order_archive = _archive_table(
+    CustomerOrder, db.Index('ix_customer_order_archive_site_date', 'site_id', 'order_date'))
+order_item_archive = _archive_table(
+    OrderItem, db.Index('ix_order_item_archive_order', 'order_id'))
+delivery_record_archive = _archive_table(
+    DeliveryRecord, db.Index('ix_delivery_record_archive_site_start', 'site_id', 'start_time'))
+service_record_archive = _archive_table(
+    ServiceRecord, db.Index('ix_service_record_archive_site_start', 'site_id', 'start_time'))
+service_feedback_archive = _archive_table(
+    ServiceFeedback, db.Index('ix_service_feedback_archive_record', 'service_record_id'))
+ai_analysis_result_archive = _archive_table(
+    AIAnalysisResult, db.Index('ix_ai_analysis_result_archive_created', 'created_at'))
@@ -1,34 +1,80 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, send_file, current_app, g
 from extensions import db, jwt
-from models import MenuCategory, Dish, Menu, MenuDish, DailyMenu, DailyMenuDish, Customer, CustomerMenu, User, BasicMenu, Ingredient, DishIngredient, CustomerOrder, OrderItem, MealSchedule, MealScheduleItem, ServiceCategory, ServiceItem, ServiceRecord, ServiceFeedback, ConfinementMealPlan, ConfinementWeekPlan, ConfinementDayPlan, ConfinementMealItem, WeChatUser, CustomerWeChat, DeliveryRecord, AIAnalysisResult, Supplier, IngredientPurchase, Alert, AlertThreshold
+from models import MenuCategory, Dish, Menu, MenuDish, DailyMenu, DailyMenuDish, Customer, CustomerMenu, User, BasicMenu, Ingredient, DishIngredient, CustomerOrder, OrderItem, MealSchedule, MealScheduleItem, ServiceCategory, ServiceItem, ServiceRecord, ServiceFeedback, ConfinementMealPlan, ConfinementWeekPlan, ConfinementDayPlan, ConfinementMealItem, ConfinementPlanTemplate, Site, WeChatUser, CustomerWeChat, DeliveryRecord, AIAnalysisResult, Supplier, IngredientPurchase
 import pandas as pd
 import os
 from datetime import datetime, timedelta
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from utils.security import requires_permission, requires_resource_permission, validate_data, handle_error
+from sqlalchemy import or_
+from sqlalchemy.orm.exc import StaleDataError
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from utils.security import (requires_permission, requires_resource_permission, requires_user, validate_data, handle_error,
+                            has_resource_permission, get_current_user as get_authenticated_user, ROLE_PERMISSIONS)
+from utils.search_index import search_index, SEARCH_ENTITIES
+from utils.ai_analyzer import AIAnalyzer
+from utils.occupancy import occupancy_calendar
+from utils.menu_resolver import menu_resolver
+from utils.plan_template import save_plan_as_template, instantiate_template
+from utils.restriction_audit import audit_restrictions
+from utils.event_bus import change_bus, topics_for_role
+from utils.image_store import image_store
+from utils.order_pricing import create_order, reconcile_order_totals
+from utils.tenancy import current_site_id
+from utils.change_log import read_changes, serialize_change, ChangeConsumer
+from utils.wechat_session import (exchange_code, login_wechat_user, wechat_access_token, wechat_session_required,
+                                  WECHAT_IDENTITY_PREFIX)
+from utils.password_hasher import password_hasher, HasherBusy
+from utils.exporter import EXPORTS, stream_csv, write_csv, write_xlsx, export_path
 
 api = Blueprint('api', __name__)
 
+@api.errorhandler(StaleDataError)
+def handle_stale_data(e):
+    """未捕获的乐观锁冲突同样返回 409"""
+    db.session.rollback()
+    return handle_error(e)
+
 @api.route('/auth/register', methods=['POST'])
 def register():
-    """用户注册"""
+    """用户注册
+
+    管理员创建账号时可指定角色，站点固定为管理员所属站点（总部管理员可指定站点，不指定即为总部账号）；
+    未登录的自助注册只能注册为普通用户，且必须指定站点，不能注册为总部账号。
+    """
     data = request.get_json()
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
     username = data.get('username')
     password = data.get('password')
-    role = data.get('role', 'user')
     
     if not username or not password:
         return jsonify({'error': 'Username and password are required'}), 400
     
+    creator = get_authenticated_user()
+    if creator and 'init' in ROLE_PERMISSIONS.get(creator.role, []):
+        role = data.get('role', 'user')
+        site_id = creator.site_id if creator.site_id is not None else data.get('site_id')
+    else:
+        role = 'user'
+        site_id = data.get('site_id')
+        if site_id is None:
+            return jsonify({'error': 'site_id is required'}), 400
+    
     existing_user = User.query.filter_by(username=username).first()
     if existing_user:
         return jsonify({'error': 'Username already exists'}), 400
     
-    user = User(username=username, role=role)
-    user.set_password(password)
+    if site_id is not None and not Site.query.get(site_id):
+        return jsonify({'error': 'Site not found'}), 400
+    
+    # 计算哈希前释放数据库连接，排队等待哈希时不占用连接池
+    db.session.rollback()
+    try:
+        password_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    
+    user = User(username=username, role=role, site_id=site_id, password_hash=password_hash)
     
     try:
         db.session.add(user)
@@ -52,26 +98,51 @@ def login():
         return jsonify({'error': 'Username and password are required'}), 400
     
     user = User.query.filter_by(username=username).first()
-    if not user or not user.check_password(password):
+    if not user:
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+    profile = {'id': user.id, 'username': user.username, 'role': user.role, 'site_id': user.site_id}
+    password_hash = user.password_hash
+    # 计算哈希前释放数据库连接，排队等待哈希时不占用连接池
+    db.session.rollback()
+    try:
+        if not password_hasher.verify(password_hash, password):
+            return jsonify({'error': 'Invalid username or password'}), 401
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    
+    return jsonify({
+        'access_token': _user_access_token(profile),
+        'refresh_token': create_refresh_token(identity=str(profile['id'])),
+        'user': profile
+    }), 200
+
+def _user_access_token(profile):
+    return create_access_token(identity=str(profile['id']),
+                               additional_claims={'role': profile['role'], 'site_id': profile['site_id']})
+
+@api.route('/auth/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    """用刷新令牌换取新的访问令牌（无需再次提交密码）；角色、站点按当前数据重新签发"""
+    identity = get_jwt_identity()
+    if identity.startswith(WECHAT_IDENTITY_PREFIX):
+        return jsonify({'access_token': wechat_access_token(int(identity[len(WECHAT_IDENTITY_PREFIX):]), fresh=True)}), 200
+    
+    user = User.query.get(int(identity))
+    if not user:
+        return jsonify({'error': 'User not found'}), 401
     
     return jsonify({
-        'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'role': user.role
-        }
+        'access_token': _user_access_token({'id': user.id, 'role': user.role, 'site_id': user.site_id})
     }), 200
 
 @api.route('/auth/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     """获取当前用户信息"""
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    identity = get_jwt_identity()
+    user = User.query.get(int(identity)) if identity.isdigit() else None
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -80,4 +151,620 @@ def get_current_user():
         'id': user.id,
         'username': user.username,
         'role': user.role
-    }), 200
\ No newline at end of file
+    }), 200
+
+@api.route('/search/typeahead', methods=['GET'])
+@requires_user()
+def search_typeahead():
+    """名称联想搜索，支持子串和拼音首字母（如 hsr -> 红烧肉）"""
+    entity = request.args.get('type', 'dish')
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    
+    if entity not in SEARCH_ENTITIES:
+        return jsonify({'error': f'Unsupported search type: {entity}'}), 400
+    
+    if not has_resource_permission(g.current_user.role, entity, 'read'):
+        return jsonify({'error': 'Permission denied for this action'}), 403
+    
+    return jsonify({
+        'type': entity,
+        'query': query,
+        'results': search_index.search(entity, query, limit)
+    }), 200
+
+@api.route('/ai/sales-forecast', methods=['GET'])
+@requires_resource_permission('ai_analysis', 'read')
+def sales_forecast():
+    """未来一周菜品销量预测"""
+    history_days = request.args.get('history_days', 365, type=int)
+    horizon = request.args.get('horizon', 7, type=int)
+    if history_days < 14 or not 1 <= horizon <= 31:
+        return jsonify({'error': 'Invalid history_days or horizon'}), 400
+    
+    try:
+        return jsonify(AIAnalyzer().forecast_sales(history_days=history_days, horizon=horizon)), 200
+    except Exception as e:
+        return handle_error(e)
+
+@api.route('/customers/occupancy', methods=['GET'])
+@requires_resource_permission('customer', 'read')
+def customer_occupancy():
+    """查询指定日期（或日期区间）在住客户"""
+    try:
+        start_date = datetime.strptime(request.args.get('date') or request.args['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', start_date.strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'date or start_date required, format YYYY-MM-DD'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'error': 'end_date must not be earlier than start_date'}), 400
+    
+    customer_ids = occupancy_calendar.customers_between(start_date, end_date)
+    return jsonify({
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'count': len(customer_ids),
+        'customer_ids': customer_ids
+    }), 200
+
+@api.route('/customers/occupancy/calendar', methods=['GET'])
+@requires_resource_permission('customer', 'read')
+def customer_occupancy_calendar():
+    """按月查询每日在住人数"""
+    try:
+        month = datetime.strptime(request.args.get('month', datetime.now().strftime('%Y-%m')), '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'month format must be YYYY-MM'}), 400
+    
+    counts = occupancy_calendar.month_counts(month.year, month.month)
+    return jsonify({
+        'month': month.strftime('%Y-%m'),
+        'daily_counts': {day.strftime('%Y-%m-%d'): count for day, count in counts.items()}
+    }), 200
+
+@api.route('/confinement-templates', methods=['GET'])
+@requires_resource_permission('confinement_meal', 'read')
+def list_confinement_templates():
+    """月子餐计划模板列表"""
+    templates = ConfinementPlanTemplate.query.order_by(ConfinementPlanTemplate.name).all()
+    return jsonify([{
+        'id': t.id,
+        'name': t.name,
+        'description': t.description,
+        'weeks': t.weeks,
+        'type': t.type
+    } for t in templates]), 200
+
+@api.route('/confinement-templates', methods=['POST'])
+@requires_resource_permission('confinement_meal', 'create')
+def create_confinement_template():
+    """将月子餐计划保存为模板"""
+    data = request.get_json()
+    valid, error = validate_data(data, ['plan_id', 'name'])
+    if not valid:
+        return jsonify(error), 400
+    
+    if ConfinementPlanTemplate.query.filter_by(name=data['name']).first():
+        return jsonify({'error': 'Template name already exists'}), 400
+    
+    try:
+        template = save_plan_as_template(data['plan_id'], data['name'], data.get('description'),
+                                         created_by=int(get_jwt_identity()))
+        db.session.commit()
+        return jsonify({'message': 'Template created successfully', 'template_id': template.id}), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/confinement-templates/<int:template_id>/instantiate', methods=['POST'])
+@requires_resource_permission('confinement_meal', 'create')
+def instantiate_confinement_template(template_id):
+    """按模板批量为客户生成月子餐计划（根据禁忌自动替换菜品）"""
+    data = request.get_json()
+    valid, error = validate_data(data, ['customers'])
+    if not valid:
+        return jsonify(error), 400
+    
+    try:
+        assignments = [{
+            'customer_id': int(c['customer_id']),
+            'start_date': datetime.strptime(c['start_date'], '%Y-%m-%d').date(),
+            'type': c.get('type')
+        } for c in data['customers']]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each customer requires customer_id and start_date (YYYY-MM-DD)'}), 400
+    
+    try:
+        result = instantiate_template(template_id, assignments)
+        db.session.commit()
+        return jsonify(result), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/menus/effective', methods=['GET'])
+@requires_resource_permission('menu', 'read')
+def effective_menu():
+    """查询日期区间内实际供应的菜单（基础餐单轮换 + 每日菜单覆盖）"""
+    try:
+        start_date = datetime.strptime(request.args.get('start_date', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', start_date.strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Date format must be YYYY-MM-DD'}), 400
+    
+    if end_date < start_date or (end_date - start_date).days > 31:
+        return jsonify({'error': 'Date range must be within 31 days'}), 400
+    
+    return jsonify({'menus': menu_resolver.resolve(start_date, end_date)}), 200
+
+@api.route('/compliance/restrictions', methods=['GET'])
+@requires_resource_permission('meal_schedule', 'read')
+def restriction_compliance():
+    """饮食禁忌合规检查：区间内排餐明细及月子餐计划与客户禁忌冲突的单项（按客户分组）"""
+    try:
+        start_date = datetime.strptime(request.args.get('start_date', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', (start_date + timedelta(days=30)).strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Date format must be YYYY-MM-DD'}), 400
+    
+    if end_date < start_date or (end_date - start_date).days > 92:
+        return jsonify({'error': 'Date range must be within 92 days'}), 400
+    
+    include_plans = request.args.get('include_plans', 'true').lower() != 'false'
+    return jsonify(audit_restrictions(start_date, end_date, include_plans=include_plans)), 200
+
+@api.route('/meal-schedules/<int:schedule_id>/publish', methods=['POST'])
+@requires_resource_permission('meal_schedule', 'update')
+def publish_meal_schedule(schedule_id):
+    """发布排餐表；存在与客户饮食禁忌冲突的菜品时拒绝发布"""
+    schedule = MealSchedule.query.get(schedule_id)
+    if not schedule:
+        return jsonify({'error': 'Meal schedule not found'}), 404
+    
+    audit = audit_restrictions(schedule.date, schedule.date, schedule_id=schedule.id)
+    if audit['violation_count']:
+        return jsonify({'error': 'Meal schedule conflicts with customer dietary restrictions', **audit}), 409
+    
+    try:
+        schedule.status = 'published'
+        db.session.commit()
+        return jsonify({'message': 'Meal schedule published', 'checked_items': audit['checked_items']}), 200
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/exports/<kind>', methods=['GET'])
+@requires_user()
+def export_data(kind):
+    """流式导出订单明细、排餐明细、采购记录（CSV / Excel）"""
+    if kind not in EXPORTS:
+        return jsonify({'error': f'Unsupported export: {kind}'}), 400
+    
+    if not has_resource_permission(g.current_user.role, EXPORTS[kind]['resource'], 'read'):
+        return jsonify({'error': 'Permission denied for this action'}), 403
+    
+    file_format = request.args.get('format', 'csv')
+    destination = request.args.get('destination', 'response')
+    if file_format not in ('csv', 'xlsx') or destination not in ('response', 'file'):
+        return jsonify({'error': 'format must be csv/xlsx, destination must be response/file'}), 400
+    
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'Date format must be YYYY-MM-DD'}), 400
+    
+    if file_format == 'csv' and destination == 'response':
+        filename = f"{kind}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+        return Response(
+            stream_with_context(stream_csv(kind, start_date, end_date)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    path = export_path(current_app.config['UPLOAD_FOLDER'], kind, file_format)
+    try:
+        writer = write_csv if file_format == 'csv' else write_xlsx
+        rows = writer(kind, path, start_date, end_date)
+    except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
+        return handle_error(e)
+    
+    if destination == 'file':
+        return jsonify({'message': 'Export completed', 'file': os.path.basename(path), 'rows': rows}), 201
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path))
+
+def _event_topics():
+    requested = request.args.get('topics')
+    return topics_for_role(g.current_user.role, requested.split(',') if requested else None)
+
+@api.route('/events/stream', methods=['GET'])
+@requires_user(locations=['headers', 'query_string'])
+def event_stream():
+    """SSE 推送排餐、送餐、库存变更（EventSource 无法设置请求头，仅本接口允许通过 ?jwt= 传递令牌）"""
+    topics = _event_topics()
+    if not topics:
+        return jsonify({'error': 'No permitted topics'}), 403
+    
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('since', change_bus.last_id, type=int)
+    
+    return Response(change_bus.stream(last_id, topics, current_site_id()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@api.route('/events/poll', methods=['GET'])
+@requires_user()
+def event_poll():
+    """长轮询获取变更（供小程序使用），返回 since 之后的事件和新的游标"""
+    topics = _event_topics()
+    if not topics:
+        return jsonify({'error': 'No permitted topics'}), 403
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'events': [], 'last_id': change_bus.last_id}), 200
+    
+    timeout = min(max(request.args.get('timeout', 25, type=float), 0), 30)
+    events, last_id = change_bus.wait(since, topics, timeout, current_site_id())
+    return jsonify({'events': events, 'last_id': last_id}), 200
+
+CUSTOMER_IMAGE_FIELDS = ('id_card_image', 'physical_exam_image')
+IMAGE_CACHE_SECONDS = 365 * 24 * 3600
+
+def _store_uploaded_image():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return None, (jsonify({'error': 'No file provided'}), 400)
+    try:
+        return image_store.save(file), None
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+def _image_urls(name):
+    return {
+        'url': image_store.url_for(name),
+        'thumbnails': {size: image_store.url_for(name, size) for size in image_store.sizes}
+    }
+
+@api.route('/customers/<int:customer_id>/images/<field>', methods=['POST'])
+@requires_resource_permission('customer', 'update')
+def upload_customer_image(customer_id, field):
+    """上传客户身份证或体检报告图片"""
+    if field not in CUSTOMER_IMAGE_FIELDS:
+        return jsonify({'error': f'Unsupported image field: {field}'}), 400
+    
+    customer = Customer.query.get(customer_id)
+    if not customer:
+        return jsonify({'error': 'Customer not found'}), 404
+    
+    name, error = _store_uploaded_image()
+    if error:
+        return error
+    
+    try:
+        setattr(customer, field, image_store.url_for(name))
+        db.session.commit()
+        return jsonify(_image_urls(name)), 201
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/ingredients/<int:ingredient_id>/image', methods=['POST'])
+@requires_resource_permission('ingredient', 'update')
+def upload_ingredient_image(ingredient_id):
+    """上传食材图片"""
+    ingredient = Ingredient.query.get(ingredient_id)
+    if not ingredient:
+        return jsonify({'error': 'Ingredient not found'}), 404
+    
+    name, error = _store_uploaded_image()
+    if error:
+        return error
+    
+    try:
+        ingredient.image_url = image_store.url_for(name)
+        db.session.commit()
+        return jsonify(_image_urls(name)), 201
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+def _image_access_error(name, user):
+    """按图片归属校验权限：客户证件/体检报告需客户读权限且客户属于当前站点，食材图片登录即可访问"""
+    url = image_store.url_for(name)
+    owned_by_customer = or_(Customer.id_card_image == url, Customer.physical_exam_image == url)
+    if db.session.query(Customer.id).filter(owned_by_customer).execution_options(all_sites=True).first():
+        if not has_resource_permission(user.role, 'customer', 'read'):
+            return jsonify({'error': 'Permission denied for this action'}), 403
+        if not db.session.query(Customer.id).filter(owned_by_customer).first():
+            return jsonify({'error': 'Image not found'}), 404
+        return None
+    if db.session.query(Ingredient.id).filter(Ingredient.image_url == url).first():
+        return None
+    return jsonify({'error': 'Image not found'}), 404
+
+@api.route('/images/<name>', methods=['GET'])
+def get_image(name):
+    """获取图片（?size=thumb|medium 获取缩略图），内容寻址，可长期缓存
+
+    需携带 Authorization 请求头（前端以 blob 方式获取），或使用 /images/<name>/signed-url 签发的短期地址直接放入 <img src>
+    """
+    if not image_store.verify_token(name, request.args.get('token')):
+        user = get_authenticated_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        error = _image_access_error(name, user)
+        if error:
+            return error
+    
+    path, exact = image_store.resolve(name, request.args.get('size'))
+    if not path:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    response = send_file(path, conditional=True, max_age=IMAGE_CACHE_SECONDS if exact else 60)
+    response.cache_control.public = None
+    response.cache_control.private = True
+    if exact:
+        response.cache_control.immutable = True
+    return response
+
+@api.route('/images/<name>/signed-url', methods=['GET'])
+@requires_user()
+def get_image_signed_url(name):
+    """签发 IMAGE_URL_MAX_AGE 秒内有效的图片地址（?size=thumb|medium），权限校验同获取图片"""
+    error = _image_access_error(name, g.current_user)
+    if error:
+        return error
+    
+    size = request.args.get('size')
+    return jsonify({
+        'url': image_store.signed_url(name, size if size in image_store.sizes else None),
+        'expires_in': image_store.url_max_age
+    }), 200
+
+@api.route('/orders', methods=['POST'])
+@requires_resource_permission('order', 'create')
+def create_customer_order():
+    """创建订单（订单金额由明细计算，新订单一律为 pending，忽略请求中的 status）"""
+    data = request.get_json()
+    valid, error = validate_data(data, ['customer_id', 'items'])
+    if not valid:
+        return jsonify(error), 400
+    
+    try:
+        order_date = datetime.strptime(data['order_date'], '%Y-%m-%d').date() if data.get('order_date') else None
+    except ValueError:
+        return jsonify({'error': 'Date format must be YYYY-MM-DD'}), 400
+    
+    try:
+        order = create_order(int(data['customer_id']), data['items'], order_date)
+        db.session.commit()
+        return jsonify({
+            'message': 'Order created successfully',
+            'order_id': order.id,
+            'total_amount': order.total_amount
+        }), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/orders/reconcile', methods=['POST'])
+@requires_resource_permission('order', 'update')
+def reconcile_orders():
+    """按日期区间重算订单金额（月末对账）"""
+    data = request.get_json(silent=True) or {}
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'Date format must be YYYY-MM-DD'}), 400
+    
+    try:
+        corrected = reconcile_order_totals(start_date, end_date)
+        db.session.commit()
+        return jsonify({'corrected_orders': corrected}), 200
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/sites', methods=['GET'])
+@requires_user()
+def get_sites():
+    """获取站点列表"""
+    sites = Site.query.order_by(Site.id).all()
+    return jsonify([{
+        'id': site.id,
+        'name': site.name,
+        'code': site.code,
+        'address': site.address
+    } for site in sites]), 200
+
+@api.route('/sites', methods=['POST'])
+@requires_permission('init')
+def create_site():
+    """创建站点（仅管理员）"""
+    data = request.get_json()
+    valid, error = validate_data(data, ['name', 'code'])
+    if not valid:
+        return jsonify(error), 400
+    
+    if Site.query.filter((Site.name == data['name']) | (Site.code == data['code'])).first():
+        return jsonify({'error': 'Site name or code already exists'}), 400
+    
+    try:
+        site = Site(name=data['name'], code=data['code'], address=data.get('address'))
+        db.session.add(site)
+        db.session.commit()
+        return jsonify({'message': 'Site created successfully', 'site_id': site.id}), 201
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/audit/changes', methods=['GET'])
+@requires_resource_permission('audit_log', 'read')
+def get_change_log():
+    """查询数据变更日志（谁在何时修改了什么），按 since 游标分页"""
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    tables = [t for t in request.args.get('table', '').split(',') if t] or None
+    row_id = request.args.get('row_id', type=int)
+    
+    entries = read_changes(since, limit, tables, row_id, site_id=current_site_id())
+    return jsonify({
+        'changes': [serialize_change(e) for e in entries],
+        'last_id': entries[-1].id if entries else since
+    }), 200
+
+@api.route('/audit/consumers/<name>', methods=['GET'])
+@requires_resource_permission('audit_log', 'consume')
+def poll_change_consumer(name):
+    """按消费者游标拉取下一批变更（消费者游标跨站点共享，仅限总部管理员）"""
+    if current_site_id() is not None:
+        return jsonify({'error': 'Change log consumers require a headquarters account'}), 403
+    limit = min(request.args.get('limit', 500, type=int), 1000)
+    tables = [t for t in request.args.get('table', '').split(',') if t] or None
+    consumer = ChangeConsumer(name, tables)
+    cursor = consumer.cursor
+    entries = consumer.poll(limit)
+    return jsonify({
+        'consumer': name,
+        'cursor': cursor,
+        'changes': [serialize_change(e) for e in entries],
+        'last_id': entries[-1].id if entries else cursor
+    }), 200
+
+@api.route('/audit/consumers/<name>/ack', methods=['POST'])
+@requires_resource_permission('audit_log', 'consume')
+def ack_change_consumer(name):
+    """确认已处理到 last_id，推进消费者游标（仅限总部管理员）"""
+    if current_site_id() is not None:
+        return jsonify({'error': 'Change log consumers require a headquarters account'}), 403
+    data = request.get_json()
+    valid, error = validate_data(data, ['last_id'])
+    if not valid:
+        return jsonify(error), 400
+    
+    try:
+        ChangeConsumer(name).ack(int(data['last_id']))
+        db.session.commit()
+        return jsonify({'consumer': name, 'cursor': ChangeConsumer(name).cursor}), 200
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/wechat/login', methods=['POST'])
+def wechat_login():
+    """小程序登录：用 wx.login 的 code 换取 openid，返回携带绑定客户ID的令牌"""
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    try:
+        if data.get('code'):
+            openid = exchange_code(data['code'])
+        elif data.get('openid') and current_app.config.get('WECHAT_DEV_LOGIN'):
+            openid = data['openid']
+        else:
+            return jsonify({'error': 'code is required'}), 400
+        token, wechat_user, customer_id = login_wechat_user(openid, data.get('nickname'), data.get('avatar'))
+        return jsonify({
+            'access_token': token,
+            'refresh_token': create_refresh_token(identity=f'{WECHAT_IDENTITY_PREFIX}{wechat_user.id}'),
+            'wechat_user_id': wechat_user.id,
+            'customer_id': customer_id
+        }), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/wechat/me', methods=['GET'])
+@wechat_session_required()
+def wechat_me():
+    """小程序：当前客户信息"""
+    customer = Customer.query.get(g.customer_id)
+    if not customer:
+        return jsonify({'error': 'Customer not found'}), 404
+    
+    return jsonify({
+        'id': customer.id,
+        'name': customer.name,
+        'check_in_date': customer.check_in_date.strftime('%Y-%m-%d') if customer.check_in_date else None,
+        'check_out_date': customer.check_out_date.strftime('%Y-%m-%d') if customer.check_out_date else None,
+        'restrictions': customer.restrictions
+    }), 200
+
+@api.route('/wechat/orders', methods=['GET'])
+@wechat_session_required()
+def wechat_orders():
+    """小程序：当前客户的订单"""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    orders = CustomerOrder.query.filter_by(customer_id=g.customer_id).order_by(
+        CustomerOrder.order_date.desc(), CustomerOrder.id.desc()).limit(limit).all()
+    return jsonify([{
+        'id': order.id,
+        'order_date': order.order_date.strftime('%Y-%m-%d'),
+        'status': order.status,
+        'total_amount': order.total_amount
+    } for order in orders]), 200
+
+@api.route('/customers/<int:customer_id>/wechat', methods=['POST'])
+@requires_resource_permission('customer', 'update')
+def bind_customer_wechat(customer_id):
+    """绑定客户与微信用户"""
+    data = request.get_json()
+    valid, error = validate_data(data, ['wechat_user_id'])
+    if not valid:
+        return jsonify(error), 400
+    
+    if not Customer.query.get(customer_id):
+        return jsonify({'error': 'Customer not found'}), 404
+    if not WeChatUser.query.get(data['wechat_user_id']):
+        return jsonify({'error': 'WeChat user not found'}), 404
+    
+    try:
+        binding = CustomerWeChat.query.filter_by(customer_id=customer_id).first()
+        if binding:
+            binding.wechat_user_id = data['wechat_user_id']
+        else:
+            db.session.add(CustomerWeChat(customer_id=customer_id, wechat_user_id=data['wechat_user_id']))
+        db.session.commit()
+        return jsonify({'message': 'WeChat user bound successfully'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
+
+@api.route('/customers/<int:customer_id>/wechat', methods=['DELETE'])
+@requires_resource_permission('customer', 'update')
+def unbind_customer_wechat(customer_id):
+    """解除客户与微信用户的绑定"""
+    # customer_wechat 不带站点字段，先按站点范围加载客户
+    if not Customer.query.get(customer_id):
+        return jsonify({'error': 'Customer not found'}), 404
+    binding = CustomerWeChat.query.filter_by(customer_id=customer_id).first()
+    if not binding:
+        return jsonify({'error': 'Binding not found'}), 404
+    
+    try:
+        db.session.delete(binding)
+        db.session.commit()
+        return jsonify({'message': 'WeChat binding removed successfully'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return handle_error(e)
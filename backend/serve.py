@@ -0,0 +1,45 @@
+"""服务启动入口
+
+    python serve.py --mode threaded   # 每个请求占用一个线程（与 app.py 的开发服务器相同）
+    python serve.py --mode gevent     # 协程模式：等待数据库/长轮询/SSE 的请求不占用线程，适合高峰期大量小程序并发
+
+gevent 模式下 pymysql（纯 Python 驱动）、socket、threading 均被协程化，
+业务代码无需改动；并发连接数由 --max-connections 限制。
+"""
+import argparse
+import os
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Meal management system server')
+    parser.add_argument('--mode', choices=['threaded', 'gevent'], default='threaded')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--max-connections', type=int, default=1000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+        os.environ.setdefault('DB_POOL_SIZE', '20')
+
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        from app import app
+
+        print(f'Serving (gevent) on {args.host}:{args.port}, max connections {args.max_connections}')
+        WSGIServer((args.host, args.port), app, spawn=Pool(args.max_connections), log=None).serve_forever()
+    else:
+        from werkzeug.serving import run_simple
+        from app import app
+
+        print(f'Serving (threaded) on {args.host}:{args.port}')
+        run_simple(args.host, args.port, app, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
-from models import Dish, OrderItem, CustomerOrder, Ingredient, DishIngredient, ServiceRecord, ServiceFeedback
+from extensions import db
+from models import OrderItem, CustomerOrder, Ingredient, ServiceRecord, ServiceFeedback
+from utils.sales_forecast import SalesForecaster
+from utils.reference_data import reference_data
+from utils.order_pricing import line_total, order_total
 from datetime import datetime, timedelta
 import json
 import numpy as np
@@ -8,10 +12,20 @@ from collections import defaultdict
 class AIAnalyzer:
     """AI数据分析器"""
     
+    @staticmethod
+    def _order_items_since(start_date):
+        """一条查询取出区间内全部订单明细，避免逐个订单加载 order_items
+
+        选择列包含 CustomerOrder 才会附加站点条件，order_id 因此取自订单表
+        """
+        return db.session.query(
+            CustomerOrder.id.label('order_id'), OrderItem.dish_id, OrderItem.price, OrderItem.quantity
+        ).join(OrderItem, OrderItem.order_id == CustomerOrder.id).filter(
+            CustomerOrder.order_date >= start_date).all()
+    
     def analyze_dish_quality(self, days=30):
         """分析菜品品质"""
         start_date = datetime.now() - timedelta(days=days)
-        orders = CustomerOrder.query.filter(CustomerOrder.order_date >= start_date.date()).all()
         
         dish_stats = defaultdict(lambda: {
             'sales_count': 0,
@@ -20,15 +34,15 @@ class AIAnalyzer:
             'total_rating': 0
         })
         
-        for order in orders:
-            for item in order.order_items:
-                dish_id = item.dish_id
-                dish_stats[dish_id]['sales_count'] += item.quantity
-                dish_stats[dish_id]['total_amount'] += item.price * item.quantity
+        for item in self._order_items_since(start_date.date()):
+            dish_id = item.dish_id
+            dish_stats[dish_id]['sales_count'] += item.quantity
+            dish_stats[dish_id]['total_amount'] += line_total(item.price, item.quantity)
         
+        reference = reference_data.current()
         quality_results = []
         for dish_id, stats in dish_stats.items():
-            dish = Dish.query.get(dish_id)
+            dish = reference.dish(dish_id)
             if not dish:
                 continue
             
@@ -39,7 +53,7 @@ class AIAnalyzer:
             quality_results.append({
                 'dish_id': dish_id,
                 'dish_name': dish.name,
-                'category': dish.category.name if dish.category else '未知',
+                'category': reference.category_name(dish.category_id, '未知'),
                 'sales_count': stats['sales_count'],
                 'total_amount': stats['total_amount'],
                 'avg_rating': avg_rating,
@@ -61,25 +75,25 @@ class AIAnalyzer:
     
     def analyze_cost_effectiveness(self):
         """分析菜品性价比"""
-        dishes = Dish.query.all()
+        reference = reference_data.current()
+        stocks = dict(db.session.query(Ingredient.id, Ingredient.stock))
+        sales = defaultdict(list)
+        for dish_id, price, quantity in db.session.query(OrderItem.dish_id, OrderItem.price, OrderItem.quantity):
+            sales[dish_id].append((price, quantity))
         cost_effectiveness_results = []
         
-        for dish in dishes:
+        for dish in reference.dishes.values():
             total_cost = 0
-            dish_ingredients = DishIngredient.query.filter_by(dish_id=dish.id).all()
-            
-            for di in dish_ingredients:
-                ingredient = Ingredient.query.get(di.ingredient_id)
-                if ingredient:
-                    total_cost += ingredient.stock * di.quantity
+            for ingredient_id, quantity in reference.recipe(dish.id):
+                if ingredient_id in stocks:
+                    total_cost += (stocks[ingredient_id] or 0) * quantity
             
             total_revenue = 0
             sales_count = 0
             
-            order_items = OrderItem.query.filter_by(dish_id=dish.id).all()
-            for item in order_items:
-                total_revenue += item.price * item.quantity
-                sales_count += item.quantity
+            for price, quantity in sales.get(dish.id, ()):
+                total_revenue += line_total(price, quantity)
+                sales_count += quantity
             
             if total_cost > 0:
                 profit_margin = (total_revenue - total_cost) / total_revenue if total_revenue > 0 else 0
@@ -91,7 +105,7 @@ class AIAnalyzer:
             cost_effectiveness_results.append({
                 'dish_id': dish.id,
                 'dish_name': dish.name,
-                'category': dish.category.name if dish.category else '未知',
+                'category': reference.category_name(dish.category_id, '未知'),
                 'total_cost': round(total_cost, 2),
                 'total_revenue': round(total_revenue, 2),
                 'sales_count': sales_count,
@@ -113,38 +127,42 @@ class AIAnalyzer:
     def analyze_sales_performance(self, days=30):
         """分析销售表现"""
         start_date = datetime.now() - timedelta(days=days)
-        orders = CustomerOrder.query.filter(CustomerOrder.order_date >= start_date.date()).all()
+        orders = db.session.query(CustomerOrder.id, CustomerOrder.order_date).filter(
+            CustomerOrder.order_date >= start_date.date()).all()
+        items_by_order = defaultdict(list)
+        for item in self._order_items_since(start_date.date()):
+            items_by_order[item.order_id].append(item)
         
         sales_by_dish = defaultdict(lambda: {'sales_count': 0, 'total_amount': 0})
         sales_by_category = defaultdict(lambda: {'sales_count': 0, 'total_amount': 0})
         sales_by_date = defaultdict(lambda: {'sales_count': 0, 'total_amount': 0})
+        reference = reference_data.current()
         
         for order in orders:
             order_date = order.order_date.strftime('%Y-%m-%d')
             sales_by_date[order_date]['sales_count'] += 1
-            sales_by_date[order_date]['total_amount'] += order.total_amount
+            order_items = items_by_order.get(order.id, ())
+            sales_by_date[order_date]['total_amount'] += order_total(order_items)
             
-            for item in order.order_items:
-                dish = item.dish
+            for item in order_items:
+                dish = reference.dish(item.dish_id)
                 if dish:
                     sales_by_dish[dish.id]['sales_count'] += item.quantity
-                    sales_by_dish[dish.id]['total_amount'] += item.price * item.quantity
+                    sales_by_dish[dish.id]['total_amount'] += line_total(item.price, item.quantity)
                     
-                    category_id = dish.category_id
-                    if category_id:
-                        category = dish.category
-                        if category:
-                            sales_by_category[category.name]['sales_count'] += item.quantity
-                            sales_by_category[category.name]['total_amount'] += item.price * item.quantity
+                    category_name = reference.category_name(dish.category_id)
+                    if category_name:
+                        sales_by_category[category_name]['sales_count'] += item.quantity
+                        sales_by_category[category_name]['total_amount'] += line_total(item.price, item.quantity)
         
         dish_sales = []
         for dish_id, stats in sales_by_dish.items():
-            dish = Dish.query.get(dish_id)
+            dish = reference.dish(dish_id)
             if dish:
                 dish_sales.append({
                     'dish_id': dish_id,
                     'dish_name': dish.name,
-                    'category': dish.category.name if dish.category else '未知',
+                    'category': reference.category_name(dish.category_id, '未知'),
                     'sales_count': stats['sales_count'],
                     'total_amount': stats['total_amount']
                 })
@@ -175,25 +193,41 @@ class AIAnalyzer:
             'start_date': start_date.strftime('%Y-%m-%d'),
             'end_date': datetime.now().strftime('%Y-%m-%d'),
             'total_orders': len(orders),
-            'total_sales_amount': sum(order.total_amount for order in orders),
+            'total_sales_amount': round(sum(stats['total_amount'] for stats in sales_by_date.values()), 2),
             'top_selling_dishes': dish_sales[:5],
             'top_selling_categories': category_sales[:3],
             'sales_trend': date_sales,
             'recommendations': recommendations
         }
     
+    def forecast_sales(self, history_days=365, horizon=7):
+        """预测未来一周菜品销量"""
+        forecaster = SalesForecaster(history_days=history_days, horizon=horizon)
+        forecast = forecaster.forecast()
+        
+        recommendations = []
+        top_dishes = [d for d in forecast['dish_forecast'][:5] if d['total_predicted'] > 0]
+        if top_dishes:
+            recommendations.append(f"预计未来{horizon}天需求最高的菜品：{', '.join([d['dish_name'] for d in top_dishes])}，建议提前备足相关食材。")
+        
+        return {
+            'analysis_type': 'sales_forecast',
+            **forecast,
+            'recommendations': recommendations
+        }
+    
     def analyze_nutritional_balance(self):
         """分析营养均衡性"""
-        dishes = Dish.query.all()
+        reference = reference_data.current()
         nutritional_results = []
         
-        for dish in dishes:
+        for dish in reference.dishes.values():
             nutrition = self._calculate_nutrition(dish)
             
             nutritional_results.append({
                 'dish_id': dish.id,
                 'dish_name': dish.name,
-                'category': dish.category.name if dish.category else '未知',
+                'category': reference.category_name(dish.category_id, '未知'),
                 'calories': nutrition['calories'],
                 'protein': nutrition['protein'],
                 'carbohydrates': nutrition['carbohydrates'],
@@ -278,13 +312,12 @@ class AIAnalyzer:
             recommendations.append(f"{top_category['category_name']}类菜品销量最高，建议丰富该类别菜品的种类，满足顾客需求。")
         
         if len(date_sales) > 7:
-            recent_sales = list(date_sales.values())[-7:]
+            recent_sales = date_sales[-7:]
             avg_recent_sales = sum(s['total_amount'] for s in recent_sales) / 7
             
-            previous_sales = list(date_sales.values())[-14:-7]
-            if previous_sales:
-                avg_previous_sales = sum(s['total_amount'] for s in previous_sales) / 7
-                
+            previous_sales = date_sales[-14:-7]
+            avg_previous_sales = sum(s['total_amount'] for s in previous_sales) / len(previous_sales)
+            if avg_previous_sales > 0:
                 if avg_recent_sales > avg_previous_sales:
                     growth_rate = (avg_recent_sales - avg_previous_sales) / avg_previous_sales
                     recommendations.append(f"销售额近期增长{round(growth_rate * 100, 2)}%，建议乘胜追击，推出更多促销活动。")
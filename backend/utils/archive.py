@@ -0,0 +1,170 @@
+from extensions import db
+from models import (CustomerOrder, OrderItem, DeliveryRecord, ServiceRecord, ServiceFeedback, AIAnalysisResult,
+                    SalesDailyRollup, ArchiveWatermark, customer_order_archive, order_item_archive,
+                    delivery_record_archive, service_record_archive, service_feedback_archive,
+                    ai_analysis_result_archive)
+from sqlalchemy import select, func, exists, union_all
+from sqlalchemy.orm import aliased
+from datetime import datetime, timedelta
+import click
+
+CLOSED_STATUSES = ('completed', 'cancelled')
+
+
+def archive_watermark(table_name):
+    """返回表的归档水位日期，未归档过返回 None"""
+    return db.session.query(ArchiveWatermark.archived_before).filter(
+        ArchiveWatermark.table_name == table_name).scalar()
+
+
+def needs_archive(table_name, start_date):
+    """查询区间起点早于归档水位（或未指定起点）时才需要合并归档数据"""
+    watermark = archive_watermark(table_name)
+    return watermark is not None and (start_date is None or start_date < watermark)
+
+
+def order_entities(start_date=None, end_date=None):
+    """返回 (订单实体, 明细实体)
+
+    查询区间全部落在热数据内时直接返回 CustomerOrder / OrderItem；否则返回在线表与归档表
+    UNION ALL 之后的 ORM 别名，日期条件下推到两侧分支，站点过滤同样自动生效。
+    """
+    if not needs_archive(CustomerOrder.__tablename__, start_date):
+        return CustomerOrder, OrderItem
+
+    def in_range(table):
+        conditions = []
+        if start_date:
+            conditions.append(table.c.order_date >= start_date)
+        if end_date:
+            conditions.append(table.c.order_date <= end_date)
+        return conditions
+
+    hot_orders = CustomerOrder.__table__
+    orders = union_all(
+        select(hot_orders).where(*in_range(hot_orders)),
+        select(customer_order_archive).where(*in_range(customer_order_archive))
+    ).subquery('customer_order_all')
+    items = union_all(
+        select(OrderItem.__table__),
+        select(order_item_archive).where(order_item_archive.c.order_id.in_(
+            select(customer_order_archive.c.id).where(*in_range(customer_order_archive))))
+    ).subquery('order_item_all')
+    return aliased(CustomerOrder, orders), aliased(OrderItem, items)
+
+
+class _Mover:
+    """将满足条件的在线记录按批次复制到归档表并删除"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def next_ids(self, table, condition):
+        return [row[0] for row in db.session.execute(
+            select(table.c.id).where(condition).order_by(table.c.id).limit(self.batch_size))]
+
+    @staticmethod
+    def move(table, archive, condition):
+        columns = [c.name for c in table.columns]
+        db.session.execute(archive.insert().from_select(columns, select(table).where(condition)))
+        return db.session.execute(table.delete().where(condition)).rowcount
+
+
+class Archiver:
+    """冷热分离：把早于归档期限的已关闭记录移入归档表，订单同时生成每日销量汇总"""
+
+    def __init__(self):
+        self.horizon_days = 180
+        self.batch_size = 5000
+
+    def init_app(self, app):
+        app.extensions['archiver'] = self
+        self.horizon_days = app.config.get('ARCHIVE_HORIZON_DAYS', 180)
+        self.batch_size = app.config.get('ARCHIVE_BATCH_SIZE', 5000)
+
+        @app.cli.command('archive')
+        @click.option('--days', type=int, default=None, help='归档早于多少天的记录')
+        def archive_command(days):
+            """归档历史订单、送餐、服务记录及 AI 分析结果"""
+            for table_name, rows in self.run(days).items():
+                click.echo(f'{table_name}: {rows}')
+
+    def run(self, days=None):
+        """执行一次归档，每批单独提交；返回各表归档行数"""
+        cutoff = datetime.now().date() - timedelta(days=days or self.horizon_days)
+        cutoff_time = datetime.combine(cutoff, datetime.min.time())
+        mover = _Mover(self.batch_size)
+        counts = {}
+
+        deliveries = DeliveryRecord.__table__
+        counts['delivery_record'] = self._drain(mover, cutoff, deliveries, delivery_record_archive,
+                                                (deliveries.c.start_time < cutoff_time)
+                                                & deliveries.c.status.in_(CLOSED_STATUSES))
+
+        records, feedback = ServiceRecord.__table__, ServiceFeedback.__table__
+        counts['service_record'] = self._drain(
+            mover, cutoff, records, service_record_archive,
+            (records.c.start_time < cutoff_time) & records.c.status.in_(CLOSED_STATUSES),
+            before_move=lambda ids: mover.move(feedback, service_feedback_archive,
+                                               feedback.c.service_record_id.in_(ids)))
+
+        orders, items = CustomerOrder.__table__, OrderItem.__table__
+
+        def move_items(ids):
+            self._rollup(ids)
+            mover.move(items, order_item_archive, items.c.order_id.in_(ids))
+
+        counts['customer_order'] = self._drain(
+            mover, cutoff, orders, customer_order_archive,
+            (orders.c.order_date < cutoff) & orders.c.status.in_(CLOSED_STATUSES)
+            & ~exists().where(deliveries.c.order_id == orders.c.id),
+            before_move=move_items)
+
+        results = AIAnalysisResult.__table__
+        counts['ai_analysis_result'] = self._drain(mover, cutoff, results, ai_analysis_result_archive,
+                                                   results.c.created_at < cutoff_time)
+        return counts
+
+    def _drain(self, mover, cutoff, table, archive, condition, before_move=None):
+        """按批移动直至没有符合条件的记录；水位与每批数据同事务推进，
+        中途失败时已提交的归档数据也一定在水位之内，查询不会漏掉"""
+        total = 0
+        while True:
+            ids = mover.next_ids(table, condition)
+            if not ids:
+                return total
+            try:
+                if before_move:
+                    before_move(ids)
+                rows = mover.move(table, archive, table.c.id.in_(ids))
+                self._advance_watermark(table.name, cutoff, rows)
+                db.session.commit()
+                total += rows
+            except Exception:
+                db.session.rollback()
+                raise
+
+    @staticmethod
+    def _rollup(order_ids):
+        orders, items = CustomerOrder.__table__, OrderItem.__table__
+        rows = select(
+            orders.c.site_id, orders.c.order_date, items.c.dish_id,
+            func.sum(items.c.quantity), func.sum(func.coalesce(items.c.price, 0) * items.c.quantity),
+            func.count(func.distinct(orders.c.id)), 0
+        ).join(items, items.c.order_id == orders.c.id).where(
+            orders.c.id.in_(order_ids)
+        ).group_by(orders.c.site_id, orders.c.order_date, items.c.dish_id)
+        db.session.execute(SalesDailyRollup.__table__.insert().from_select(
+            ['site_id', 'date', 'dish_id', 'quantity', 'amount', 'order_count', 'version'], rows))
+
+    @staticmethod
+    def _advance_watermark(table_name, cutoff, rows):
+        watermark = ArchiveWatermark.query.filter_by(table_name=table_name).first()
+        if watermark is None:
+            db.session.add(ArchiveWatermark(table_name=table_name, archived_before=cutoff, archived_rows=rows))
+        else:
+            watermark.archived_before = max(watermark.archived_before, cutoff)
+            watermark.archived_rows = (watermark.archived_rows or 0) + rows
+
+
+archiver = Archiver()
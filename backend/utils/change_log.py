@@ -0,0 +1,180 @@
+from extensions import db
+from models import BaseModel, ChangeLog, ChangeLogCursor
+from flask import has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+_PENDING_KEY = 'change_log_pending'
+_REDACTED_FIELDS = {'password_hash'}
+_SKIPPED_FIELDS = {'version'}
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _column_keys(mapper):
+    return [attr.key for attr in mapper.column_attrs if attr.key not in _SKIPPED_FIELDS]
+
+
+def _snapshot(state):
+    values = {}
+    for key in _column_keys(state.mapper):
+        values[key] = '***' if key in _REDACTED_FIELDS else _json_value(state.dict.get(key))
+    return values
+
+
+def _diff(state):
+    changes = {}
+    for key in _column_keys(state.mapper):
+        history = state.attrs[key].history
+        if not history.has_changes():
+            continue
+        if key in _REDACTED_FIELDS:
+            changes[key] = ['***', '***']
+            continue
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        changes[key] = [_json_value(old), _json_value(new)]
+    return changes
+
+
+def _current_user_id():
+    if not has_request_context():
+        return None
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        return None
+    # 微信小程序令牌的 identity 为 'wechat:<id>'，不对应后台用户
+    return int(identity) if identity and identity.isdigit() else None
+
+
+class ChangeCapture:
+    """变更数据捕获（CDC）
+
+    after_flush 时根据属性历史收集 BaseModel 子类的增删改（只在内存中追加），
+    提交前将本事务的全部变更以一条批量 INSERT 写入 change_log，与业务数据同事务提交；
+    日志 id 与 created_at 均在提交前一刻生成。
+    Core 层批量语句（bulk insert / 集合 UPDATE）不经过 ORM 会话事件，不会被记录。
+    """
+
+    def __init__(self):
+        self.enabled = True
+
+    def init_app(self, app):
+        app.extensions['change_capture'] = self
+        self.enabled = app.config.get('CHANGE_LOG_ENABLED', True)
+        event.listen(Session, 'after_flush', self._collect)
+        event.listen(Session, 'before_commit', self._write)
+        event.listen(Session, 'after_rollback', self._discard)
+
+    def _collect(self, session, flush_context):
+        if not self.enabled:
+            return
+        user_id = _current_user_id()
+        pending = session.info.setdefault(_PENDING_KEY, [])
+        for op, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+            for obj in objects:
+                if not isinstance(obj, BaseModel):
+                    continue
+                state = inspect(obj)
+                if op == 'update':
+                    changes = _diff(state)
+                    if not changes:
+                        continue
+                else:
+                    changes = _snapshot(state)
+                pending.append({
+                    'table_name': obj.__tablename__,
+                    'row_id': obj.id,
+                    'op': op,
+                    'version': state.dict.get('version'),
+                    'changes': changes,
+                    'user_id': user_id,
+                    'site_id': state.dict.get('site_id')
+                })
+
+    def _write(self, session):
+        if not self.enabled:
+            return
+        # commit() 在 before_commit 之后才做最后一次 flush，这里先 flush 以收齐本事务的变更
+        session.flush()
+        pending = session.info.pop(_PENDING_KEY, None)
+        if pending:
+            # 写入时间取提交时刻而不是 flush 时刻：长事务中早已 flush 的变更不会因时间过早而被消费者越过
+            now = datetime.now()
+            session.execute(ChangeLog.__table__.insert(), [dict(entry, created_at=now) for entry in pending])
+
+    @staticmethod
+    def _discard(session):
+        session.info.pop(_PENDING_KEY, None)
+
+
+def read_changes(since_id=0, limit=500, tables=None, row_id=None, before=None, site_id=None):
+    """读取 since_id 之后的变更，按 id 递增返回；before 限定只读取该时间之前写入的变更"""
+    query = ChangeLog.query.filter(ChangeLog.id > since_id)
+    if site_id is not None:
+        query = query.filter(ChangeLog.site_id == site_id)
+    if before is not None:
+        query = query.filter(ChangeLog.created_at <= before)
+    if tables:
+        query = query.filter(ChangeLog.table_name.in_(tables))
+    if row_id is not None:
+        query = query.filter(ChangeLog.row_id == row_id)
+    return query.order_by(ChangeLog.id).limit(limit).all()
+
+
+def serialize_change(entry):
+    return {
+        'id': entry.id,
+        'table': entry.table_name,
+        'row_id': entry.row_id,
+        'op': entry.op,
+        'version': entry.version,
+        'changes': entry.changes,
+        'user_id': entry.user_id,
+        'site_id': entry.site_id,
+        'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S') if entry.created_at else None
+    }
+
+
+class ChangeConsumer:
+    """带持久化游标的增量消费者：poll() 取下一批变更，处理完成后 ack() 推进游标
+
+    并发事务的提交顺序可能与日志 id 顺序不一致，poll() 只返回 lag_seconds 之前写入的变更，
+    避免游标越过尚未提交的较小 id。日志行在提交前一刻插入并记录时间，
+    从插入到提交的间隔远小于 lag_seconds，事务本身持续多久不影响这一判断。
+    """
+
+    def __init__(self, name, tables=None, lag_seconds=2):
+        self.name = name
+        self.tables = tables
+        self.lag_seconds = lag_seconds
+
+    @property
+    def cursor(self):
+        return db.session.query(ChangeLogCursor.last_id).filter(
+            ChangeLogCursor.consumer == self.name).scalar() or 0
+
+    def poll(self, limit=500):
+        before = datetime.now() - timedelta(seconds=self.lag_seconds) if self.lag_seconds else None
+        return read_changes(self.cursor, limit, self.tables, before=before)
+
+    def ack(self, last_id):
+        """推进游标（调用方负责提交）；游标只前进不后退"""
+        cursor = ChangeLogCursor.query.get(self.name)
+        if cursor is None:
+            db.session.add(ChangeLogCursor(consumer=self.name, last_id=last_id))
+        elif last_id > cursor.last_id:
+            cursor.last_id = last_id
+
+
+change_capture = ChangeCapture()
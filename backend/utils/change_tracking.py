@@ -0,0 +1,33 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+def track_commits(key, models, snapshot, callback, delete_snapshot=None):
+    """收集指定模型在事务内的增删改，提交成功后统一回调
+
+    callback 接收 [(op, model, id, data)]，op 为 'upsert' 或 'delete'；
+    data 为 flush 时 snapshot(obj) 的结果（删除时为 delete_snapshot(obj)，未提供则为 None），避免提交后访问已过期的属性。
+    回滚时丢弃已收集的变更。
+    """
+    models = tuple(models)
+
+    def collect(session, flush_context):
+        pending = session.info.setdefault(key, [])
+        for obj in session.new.union(session.dirty):
+            if isinstance(obj, models):
+                pending.append(('upsert', type(obj), obj.id, snapshot(obj)))
+        for obj in session.deleted:
+            if isinstance(obj, models):
+                pending.append(('delete', type(obj), obj.id, delete_snapshot(obj) if delete_snapshot else None))
+
+    def apply(session):
+        pending = session.info.pop(key, None)
+        if pending:
+            callback(pending)
+
+    def discard(session):
+        session.info.pop(key, None)
+
+    event.listen(Session, 'after_flush', collect)
+    event.listen(Session, 'after_commit', apply)
+    event.listen(Session, 'after_rollback', discard)
@@ -0,0 +1,137 @@
+from models import MealScheduleItem, DeliveryRecord, Ingredient
+from utils.change_tracking import track_commits
+from utils.security import has_resource_permission
+from sqlalchemy import inspect
+from collections import deque
+from datetime import datetime
+import json
+import threading
+import time
+
+
+def _changed(obj, *fields):
+    state = inspect(obj)
+    if state.pending or not state.has_identity:
+        return True
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _schedule_item_event(item):
+    if not _changed(item, 'status', 'dish_id', 'quantity'):
+        return None
+    return {'id': item.id, 'site_id': item.site_id, 'schedule_id': item.schedule_id, 'customer_id': item.customer_id,
+            'dish_id': item.dish_id, 'quantity': item.quantity, 'status': item.status}
+
+
+def _delivery_event(record):
+    if not _changed(record, 'status'):
+        return None
+    return {'id': record.id, 'site_id': record.site_id, 'customer_id': record.customer_id, 'order_id': record.order_id,
+            'meal_schedule_item_id': record.meal_schedule_item_id, 'status': record.status}
+
+
+def _stock_event(ingredient):
+    if not _changed(ingredient, 'stock'):
+        return None
+    return {'id': ingredient.id, 'name': ingredient.name, 'stock': ingredient.stock, 'unit': ingredient.unit}
+
+
+# 主题 -> (模型, 权限资源, 事件数据提取)
+TOPICS = {
+    'meal_schedule': (MealScheduleItem, 'meal_schedule', _schedule_item_event),
+    'delivery': (DeliveryRecord, 'delivery', _delivery_event),
+    'stock': (Ingredient, 'ingredient', _stock_event)
+}
+
+# 各站点共用数据的主题（食材库存不分站点），其余主题的事件只推送给所属站点
+SHARED_TOPICS = {'stock'}
+
+_MODEL_TOPICS = {model: topic for topic, (model, _, _) in TOPICS.items()}
+
+
+def _delete_event(obj):
+    # 删除时只保留 id 与所属站点，供按站点过滤
+    return {'id': obj.id, 'site_id': inspect(obj).dict.get('site_id')}
+
+
+def topics_for_role(role, requested=None):
+    """角色可订阅的主题（按 RESOURCE_PERMISSIONS 的 read 权限过滤）"""
+    topics = requested or TOPICS.keys()
+    return {t for t in topics if t in TOPICS and has_resource_permission(role, TOPICS[t][1], 'read')}
+
+
+class ChangeBus:
+    """进程内变更总线：事务提交后发布排餐、送餐、库存变更，供 SSE / 长轮询订阅"""
+
+    def __init__(self, capacity=1000):
+        self._events = deque(maxlen=capacity)
+        self._last_id = 0
+        self._condition = threading.Condition()
+
+    def init_app(self, app):
+        app.extensions['change_bus'] = self
+        snapshots = {model: extract for model, _, extract in TOPICS.values()}
+        track_commits('change_bus_pending', snapshots.keys(),
+                      lambda obj: snapshots[type(obj)](obj), self._on_commit, delete_snapshot=_delete_event)
+
+    def _on_commit(self, changes):
+        events = []
+        for op, model, obj_id, data in changes:
+            if op == 'upsert' and data is None:
+                continue
+            events.append({'topic': _MODEL_TOPICS[model], 'op': op,
+                           'data': data if data is not None else {'id': obj_id}})
+        if events:
+            self.publish_many(events)
+
+    def publish_many(self, events):
+        with self._condition:
+            timestamp = datetime.now().isoformat(timespec='seconds')
+            for event in events:
+                self._last_id += 1
+                self._events.append({'id': self._last_id, 'timestamp': timestamp, **event})
+            self._condition.notify_all()
+
+    def publish(self, topic, op, data):
+        self.publish_many([{'topic': topic, 'op': op, 'data': data}])
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def _since(self, last_id, topics, site_id):
+        if not self._events or self._events[-1]['id'] <= last_id:
+            return []
+        return [e for e in self._events if e['id'] > last_id and e['topic'] in topics
+                and (site_id is None or e['topic'] in SHARED_TOPICS or e['data'].get('site_id') == site_id)]
+
+    def wait(self, last_id, topics, timeout, site_id=None):
+        """等待 last_id 之后的事件，返回 (事件列表, 新游标)，超时返回空列表；指定 site_id 时只返回该站点及共用主题的事件"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if last_id > self._last_id:
+                # 服务重启后客户端游标失效，从当前位置开始
+                last_id = self._last_id
+            while True:
+                events = self._since(last_id, topics, site_id)
+                if events:
+                    return events, events[-1]['id']
+                last_id = max(last_id, self._last_id)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], last_id
+                self._condition.wait(remaining)
+
+    def stream(self, last_id, topics, site_id=None, heartbeat=15):
+        """生成 SSE 文本流，空闲时发送心跳注释保持连接"""
+        yield 'retry: 3000\n\n'
+        while True:
+            events, last_id = self.wait(last_id, topics, heartbeat, site_id)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                yield f"id: {event['id']}\nevent: {event['topic']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+change_bus = ChangeBus()
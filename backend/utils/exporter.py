@@ -0,0 +1,142 @@
+from extensions import db
+from models import (Customer, Dish, MenuCategory, MealSchedule, MealScheduleItem,
+                    Ingredient, Supplier, IngredientPurchase)
+from utils.archive import order_entities
+from sqlalchemy import select, func
+from openpyxl import Workbook
+from datetime import datetime
+import csv
+import io
+import os
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _orders_query(start_date, end_date):
+    Order, Item = order_entities(start_date, end_date)
+    stmt = select(
+        Order.id, Order.order_date, Customer.name, Order.status,
+        Order.total_amount, Item.id, Dish.name, Item.quantity, Item.price
+    ).join(Item, Item.order_id == Order.id
+    ).join(Customer, Customer.id == Order.customer_id
+    ).join(Dish, Dish.id == Item.dish_id, isouter=True)
+    if start_date:
+        stmt = stmt.where(Order.order_date >= start_date)
+    if end_date:
+        stmt = stmt.where(Order.order_date <= end_date)
+    return stmt.order_by(Order.order_date, Order.id, Item.id)
+
+
+def _schedules_query(start_date, end_date):
+    stmt = select(
+        MealSchedule.date, MealSchedule.status, MealScheduleItem.id, Customer.name, MenuCategory.name,
+        Dish.name, MealScheduleItem.quantity, MealScheduleItem.status
+    ).join(MealScheduleItem, MealScheduleItem.schedule_id == MealSchedule.id
+    ).join(Customer, Customer.id == MealScheduleItem.customer_id
+    ).join(MenuCategory, MenuCategory.id == MealScheduleItem.category_id, isouter=True
+    ).join(Dish, Dish.id == MealScheduleItem.dish_id, isouter=True)
+    if start_date:
+        stmt = stmt.where(MealSchedule.date >= start_date)
+    if end_date:
+        stmt = stmt.where(MealSchedule.date <= end_date)
+    return stmt.order_by(MealSchedule.date, MealScheduleItem.id)
+
+
+def _purchases_query(start_date, end_date):
+    stmt = select(
+        IngredientPurchase.id, IngredientPurchase.purchase_date, Ingredient.name, Supplier.name,
+        IngredientPurchase.quantity, Ingredient.unit, IngredientPurchase.unit_price,
+        IngredientPurchase.total_price, IngredientPurchase.batch_number, IngredientPurchase.notes
+    ).join(Ingredient, Ingredient.id == IngredientPurchase.ingredient_id
+    ).join(Supplier, Supplier.id == IngredientPurchase.supplier_id)
+    if start_date:
+        stmt = stmt.where(IngredientPurchase.purchase_date >= start_date)
+    if end_date:
+        stmt = stmt.where(func.date(IngredientPurchase.purchase_date) <= end_date)
+    return stmt.order_by(IngredientPurchase.purchase_date, IngredientPurchase.id)
+
+
+EXPORTS = {
+    'orders': {
+        'resource': 'order',
+        'headers': ['订单ID', '订单日期', '客户', '订单状态', '订单金额', '明细ID', '菜品', '数量', '单价'],
+        'query': _orders_query
+    },
+    'schedules': {
+        'resource': 'meal_schedule',
+        'headers': ['日期', '排餐状态', '明细ID', '客户', '餐别', '菜品', '数量', '状态'],
+        'query': _schedules_query
+    },
+    'purchases': {
+        'resource': 'ingredient_purchase',
+        'headers': ['采购ID', '采购时间', '食材', '供应商', '数量', '单位', '单价', '总价', '批次号', '备注'],
+        'query': _purchases_query
+    }
+}
+
+
+def iter_export_rows(kind, start_date=None, end_date=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """按块流式读取导出数据（服务端游标），每次产出一批行"""
+    stmt = EXPORTS[kind]['query'](start_date, end_date)
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for partition in result.partitions(chunk_size):
+            yield partition
+    finally:
+        result.close()
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def stream_csv(kind, start_date=None, end_date=None):
+    """逐块生成 CSV 文本（带 BOM，便于 Excel 识别中文）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORTS[kind]['headers'])
+    yield buffer.getvalue()
+
+    for partition in iter_export_rows(kind, start_date, end_date):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_cell(v) for v in row] for row in partition)
+        yield buffer.getvalue()
+
+
+def write_csv(kind, path, start_date=None, end_date=None):
+    """将导出逐块写入 CSV 文件，返回数据行数"""
+    rows = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORTS[kind]['headers'])
+        for partition in iter_export_rows(kind, start_date, end_date):
+            writer.writerows([_cell(v) for v in row] for row in partition)
+            rows += len(partition)
+    return rows
+
+
+def write_xlsx(kind, path, start_date=None, end_date=None):
+    """以 openpyxl 只写模式逐行写入 Excel 文件，返回数据行数"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(kind)
+    sheet.append(EXPORTS[kind]['headers'])
+    rows = 0
+    for partition in iter_export_rows(kind, start_date, end_date):
+        for row in partition:
+            sheet.append([_cell(v) for v in row])
+        rows += len(partition)
+    workbook.save(path)
+    return rows
+
+
+def export_path(upload_folder, kind, file_format):
+    export_dir = os.path.join(upload_folder, 'exports')
+    os.makedirs(export_dir, exist_ok=True)
+    filename = f"{kind}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.{file_format}"
+    return os.path.join(export_dir, filename)
@@ -0,0 +1,140 @@
+from PIL import Image, ImageOps, UnidentifiedImageError
+from concurrent.futures import ThreadPoolExecutor
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+_PIL_FORMATS = {ext: image_format for image_format, ext in IMAGE_FORMATS.items()}
+_NAME_PATTERN = re.compile(r'^([0-9a-f]{64})\.(jpg|png|webp)$')
+_CHUNK_SIZE = 64 * 1024
+
+
+class ImageStore:
+    """内容寻址的图片存储：按 SHA-256 命名去重，后台线程池生成缩略图"""
+
+    def __init__(self):
+        self.folder = None
+        self.sizes = {}
+        self.max_bytes = 0
+        self.url_max_age = 0
+        self._executor = None
+        self._signer = None
+
+    def init_app(self, app):
+        app.extensions['image_store'] = self
+        self.folder = os.path.abspath(app.config.get('IMAGE_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'images')))
+        self.sizes = app.config.get('IMAGE_THUMBNAIL_SIZES', {'thumb': 160, 'medium': 640})
+        self.max_bytes = app.config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+        self.url_max_age = app.config.get('IMAGE_URL_MAX_AGE', 300)
+        self._signer = URLSafeTimedSerializer(app.config['JWT_SECRET_KEY'], salt='image-url')
+        self._executor = ThreadPoolExecutor(max_workers=app.config.get('IMAGE_WORKERS', 2),
+                                            thread_name_prefix='image-thumbnail')
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, digest, ext, size=None):
+        suffix = f'_{size}' if size else ''
+        return os.path.join(self.folder, digest[:2], f'{digest}{suffix}.{ext}')
+
+    @staticmethod
+    def url_for(name, size=None):
+        return f'/api/images/{name}' + (f'?size={size}' if size else '')
+
+    def signed_url(self, name, size=None):
+        """签发 IMAGE_URL_MAX_AGE 秒内有效的图片地址，无需 Authorization 请求头即可访问（用于 <img src>）"""
+        url = self.url_for(name, size)
+        return url + ('&' if size else '?') + f'token={self._signer.dumps(name)}'
+
+    def verify_token(self, name, token):
+        """签名地址中的 token 是否为该图片签发且未过期"""
+        if not token:
+            return False
+        try:
+            return self._signer.loads(token, max_age=self.url_max_age) == name
+        except BadSignature:
+            return False
+
+    def save(self, file_storage):
+        """流式写入上传文件并计算哈希；内容相同的图片只保存一份，返回文件名 <sha256>.<ext>"""
+        digest = hashlib.sha256()
+        written = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = file_storage.stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        raise ValueError(f'Image exceeds {self.max_bytes} bytes')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            if not written:
+                raise ValueError('Empty file')
+
+            try:
+                with Image.open(tmp_path) as image:
+                    image_format = image.format
+                    image.verify()
+            except (UnidentifiedImageError, OSError, SyntaxError):
+                raise ValueError('Invalid image file')
+            ext = IMAGE_FORMATS.get(image_format)
+            if not ext:
+                raise ValueError(f'Unsupported image format: {image_format}')
+
+            hex_digest = digest.hexdigest()
+            target = self.path(hex_digest, ext)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if any(not os.path.exists(self.path(hex_digest, ext, size)) for size in self.sizes):
+            self._executor.submit(self._make_thumbnails, hex_digest, ext)
+        return f'{hex_digest}.{ext}'
+
+    def _make_thumbnails(self, digest, ext):
+        source = self.path(digest, ext)
+        try:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                for size, edge in self.sizes.items():
+                    target = self.path(digest, ext, size)
+                    if os.path.exists(target):
+                        continue
+                    thumbnail = image.copy()
+                    thumbnail.thumbnail((edge, edge))
+                    tmp_path = f'{target}.tmp'
+                    thumbnail.save(tmp_path, format=_PIL_FORMATS[ext])
+                    os.replace(tmp_path, target)
+        except Exception:
+            logger.exception('Failed to generate thumbnails for %s.%s', digest, ext)
+
+    def resolve(self, name, size=None):
+        """返回 (文件路径, 是否为所请求的尺寸)；缩略图尚未生成时退回原图，不存在时返回 (None, False)"""
+        match = _NAME_PATTERN.match(name or '')
+        if not match:
+            return None, False
+        digest, ext = match.groups()
+        if size in self.sizes:
+            thumbnail = self.path(digest, ext, size)
+            if os.path.exists(thumbnail):
+                return thumbnail, True
+        original = self.path(digest, ext)
+        if not os.path.exists(original):
+            return None, False
+        return original, size not in self.sizes
+
+
+image_store = ImageStore()
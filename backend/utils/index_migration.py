@@ -0,0 +1,151 @@
+from extensions import db
+from models import SiteScopedMixin
+from sqlalchemy import inspect, literal, text
+import click
+
+
+def _current_indexes(inspector, table_name):
+    indexes = {index['name']: index for index in inspector.get_indexes(table_name)}
+    if inspector.dialect.name == 'sqlite':
+        # SQLite 反射会跳过表达式索引（如 coalesce(site_id, 0)），按 sqlite_master 补齐
+        with inspector.bind.connect() as connection:
+            for name, sql in connection.execute(text(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+                    {'table': table_name}):
+                indexes.setdefault(name, {'name': name, 'unique': sql.upper().startswith('CREATE UNIQUE')})
+    return indexes
+
+
+class IndexMigration:
+    """将已有数据库的列和索引同步为 models.py 中的定义
+
+    db.create_all() 不会修改已存在的表，调整模型后需执行 flask sync-indexes：
+    先为已有表补齐新增的列（如 site_id、version），再创建模型中新增的索引，最后删除模型中已不存在的 ix_ 前缀普通索引；
+    同名索引的唯一性与模型不一致时（如排餐日期由全局唯一改为站点内唯一）删除后重建。
+    模型中已不存在的 uq_ 前缀唯一索引也会删除；外键自动索引及其他命名的索引不会被删除；列只增不删、不修改类型。
+    """
+
+    def init_app(self, app):
+        app.extensions['index_migration'] = self
+
+        @app.cli.command('sync-indexes')
+        @click.option('--dry-run', is_flag=True, help='只打印将要执行的变更')
+        @click.option('--site-id', type=int, help='将 site_id 为空的已有站点数据归属到该站点')
+        def sync_indexes_command(dry_run, site_id):
+            """补齐新增列，按模型定义创建复合索引、删除冗余的单列索引"""
+            to_add = self.plan_columns()
+            to_create, to_drop = self.plan()
+            for column in to_add:
+                click.echo(f'add column {column.table.name}.{column.name}')
+            if site_id is not None:
+                click.echo(f'set site_id = {site_id} where site_id is null')
+            for index in to_create:
+                click.echo(f"create {index.name} on {index.table.name} ({', '.join(c.name for c in index.columns)})")
+            for table_name, index_name in to_drop:
+                click.echo(f'drop {index_name} on {table_name}')
+            if not dry_run:
+                self.add_columns(to_add)
+                if site_id is not None:
+                    self.backfill_site(site_id)
+                # 新增列之后重新检查，列上的索引此时才能创建
+                self.apply(*self.plan())
+
+    @staticmethod
+    def plan_columns(engine=None):
+        """返回已有表中缺少的列（Column 列表）"""
+        inspector = inspect(engine or db.engine)
+        existing_tables = set(inspector.get_table_names())
+        to_add = []
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            current = {column['name'] for column in inspector.get_columns(table.name)}
+            to_add += [column for column in table.columns if column.name not in current]
+        return to_add
+
+    @staticmethod
+    def add_columns(columns, engine=None):
+        """ALTER TABLE 补齐列；NOT NULL 列按模型的默认值回填已有行"""
+        engine = engine or db.engine
+        dialect = engine.dialect
+        quote = dialect.identifier_preparer.quote
+        with engine.begin() as connection:
+            for column in columns:
+                table = quote(column.table.name)
+                spec = f'{quote(column.name)} {column.type.compile(dialect=dialect)}'
+                if not column.nullable:
+                    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                    if default is None:
+                        raise click.ClickException(
+                            f'{column.table.name}.{column.name} is NOT NULL without a default, migrate it manually')
+                    value = literal(default, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+                    spec += f' NOT NULL DEFAULT {value}'
+                foreign_keys = list(column.foreign_keys)
+                if foreign_keys and dialect.name == 'sqlite':
+                    # SQLite 不支持 ALTER TABLE ADD CONSTRAINT，外键只能随列定义
+                    target = foreign_keys[0].column
+                    spec += f' REFERENCES {quote(target.table.name)} ({quote(target.name)})'
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {spec}'))
+                if dialect.name != 'sqlite':
+                    for foreign_key in foreign_keys:
+                        target = foreign_key.column
+                        connection.execute(text(
+                            f'ALTER TABLE {table} ADD FOREIGN KEY ({quote(column.name)}) '
+                            f'REFERENCES {quote(target.table.name)} ({quote(target.name)})'))
+
+    @staticmethod
+    def backfill_site(site_id, engine=None):
+        """将各站点表中 site_id 为空的行归属到指定站点（单站点部署升级为多站点时使用）"""
+        engine = engine or db.engine
+        with engine.begin() as connection:
+            for mapper in db.Model.registry.mappers:
+                if issubclass(mapper.class_, SiteScopedMixin):
+                    table = mapper.local_table
+                    connection.execute(table.update().where(table.c.site_id.is_(None)).values(site_id=site_id))
+
+    @staticmethod
+    def plan(engine=None):
+        """返回 (待创建的 Index 列表, 待删除的 (表名, 索引名) 列表)，只处理数据库中已存在的表"""
+        inspector = inspect(engine or db.engine)
+        existing_tables = set(inspector.get_table_names())
+        to_create, to_drop = [], []
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            defined = {index.name for index in table.indexes}
+            current = _current_indexes(inspector, table.name)
+            changed = {index.name for index in table.indexes
+                       if index.name in current and bool(current[index.name].get('unique')) != bool(index.unique)}
+            to_create += [index for index in table.indexes if index.name not in current or index.name in changed]
+            constraints = {constraint.name for constraint in table.constraints}
+            to_drop += [(table.name, name) for name, index in current.items()
+                        if name in changed
+                        or name and name.startswith('ix_') and name not in defined and not index.get('unique')
+                        or name and name.startswith('uq_') and name not in defined and name not in constraints]
+        return to_create, to_drop
+
+    @staticmethod
+    def apply(to_create, to_drop, engine=None):
+        engine = engine or db.engine
+        quote = engine.dialect.identifier_preparer.quote
+        recreated = {index.name for index in to_create}
+
+        def drop(connection, table_name, index_name):
+            if engine.dialect.name == 'mysql':
+                connection.execute(text(f'DROP INDEX {quote(index_name)} ON {quote(table_name)}'))
+            else:
+                connection.execute(text(f'DROP INDEX {quote(index_name)}'))
+
+        # 先建后删：MySQL 外键列至少要保留一个可用索引；需要重建的同名索引先删除
+        with engine.begin() as connection:
+            for table_name, index_name in to_drop:
+                if index_name in recreated:
+                    drop(connection, table_name, index_name)
+            for index in to_create:
+                index.create(connection)
+            for table_name, index_name in to_drop:
+                if index_name not in recreated:
+                    drop(connection, table_name, index_name)
+
+
+index_migration = IndexMigration()
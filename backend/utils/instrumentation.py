@@ -0,0 +1,239 @@
+from flask import request, Response, jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+from contextvars import ContextVar
+import heapq
+import hmac
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_collectors = ContextVar('sql_collectors', default=())
+
+
+class QueryCollector:
+    """统计一段代码（一次请求或一个测试块）内执行的SQL语句"""
+    __slots__ = ('count', 'db_time', 'slowest', 'keep')
+
+    def __init__(self, keep=5):
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest = []
+        self.keep = keep
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.db_time += elapsed
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (elapsed, statement))
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed, statement))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors.get():
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _collectors.get()
+    if not collectors:
+        return
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for collector in collectors:
+        collector.record(statement, elapsed)
+
+
+@contextmanager
+def collect_queries(keep=5):
+    """在代码块内收集SQL统计，返回 QueryCollector"""
+    collector = QueryCollector(keep)
+    token = _collectors.set(_collectors.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def query_budget(max_statements):
+    """测试辅助：代码块内执行的SQL语句数超过预算时抛出 AssertionError"""
+    with collect_queries() as collector:
+        yield collector
+    if collector.count > max_statements:
+        slowest = '\n'.join(statement for _, statement in sorted(collector.slowest, reverse=True))
+        raise AssertionError(f'Query budget exceeded: {collector.count} > {max_statements}\n{slowest}')
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'latency_sum', 'buckets', 'statements', 'db_time', 'budget_exceeded', 'slowest')
+
+    def __init__(self):
+        self.requests = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.statements = 0
+        self.db_time = 0.0
+        self.budget_exceeded = 0
+        self.slowest = []
+
+
+class Instrumentation:
+    """按接口统计请求耗时、SQL语句数与数据库耗时"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.query_budget = None
+        self.keep_slowest = 5
+        self.metrics_token = None
+
+    def init_app(self, app):
+        app.extensions['instrumentation'] = self
+        self.query_budget = app.config.get('QUERY_BUDGET')
+        self.keep_slowest = app.config.get('SLOW_QUERY_KEEP', self.keep_slowest)
+        self.metrics_token = app.config.get('METRICS_TOKEN')
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.add_url_rule('/metrics/slow-queries', 'metrics_slow_queries', self.slow_queries_view)
+
+    def _before_request(self):
+        collector = QueryCollector(self.keep_slowest)
+        request.environ['instrumentation.collector'] = collector
+        request.environ['instrumentation.token'] = _collectors.set(_collectors.get() + (collector,))
+        request.environ['instrumentation.start'] = time.perf_counter()
+
+    def _after_request(self, response):
+        collector = request.environ.get('instrumentation.collector')
+        if collector is None:
+            return response
+        elapsed = time.perf_counter() - request.environ['instrumentation.start']
+        endpoint = request.endpoint or 'unmatched'
+        exceeded = self.query_budget is not None and collector.count > self.query_budget
+
+        response.headers['X-Query-Count'] = str(collector.count)
+        response.headers['X-DB-Time-Ms'] = f'{collector.db_time * 1000:.2f}'
+        if exceeded:
+            logger.warning('Query budget exceeded on %s: %d statements (budget %d)',
+                           endpoint, collector.count, self.query_budget)
+
+        self._record(endpoint, elapsed, collector, exceeded)
+        return response
+
+    def _teardown_request(self, exc):
+        token = request.environ.pop('instrumentation.token', None)
+        if token is not None:
+            _collectors.reset(token)
+
+    def _record(self, endpoint, elapsed, collector, exceeded):
+        bucket = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                bucket = i
+                break
+
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = _EndpointStats()
+            stats.requests += 1
+            stats.latency_sum += elapsed
+            stats.buckets[bucket] += 1
+            stats.statements += collector.count
+            stats.db_time += collector.db_time
+            stats.budget_exceeded += exceeded
+            for item in collector.slowest:
+                if len(stats.slowest) < self.keep_slowest:
+                    heapq.heappush(stats.slowest, item)
+                elif item[0] > stats.slowest[0][0]:
+                    heapq.heapreplace(stats.slowest, item)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self):
+        """当前各接口统计的副本"""
+        with self._lock:
+            return {endpoint: {
+                'requests': s.requests,
+                'latency_sum': s.latency_sum,
+                'buckets': list(s.buckets),
+                'statements': s.statements,
+                'db_time': s.db_time,
+                'budget_exceeded': s.budget_exceeded,
+                'slowest': sorted(s.slowest, reverse=True)
+            } for endpoint, s in self._stats.items()}
+
+    def render_prometheus(self):
+        lines = [
+            '# HELP meal_http_request_duration_seconds Request latency by endpoint.',
+            '# TYPE meal_http_request_duration_seconds histogram'
+        ]
+        snapshot = self.snapshot()
+        for endpoint, s in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), s['buckets']):
+                cumulative += count
+                lines.append(f'meal_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'meal_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {s["latency_sum"]:.6f}')
+            lines.append(f'meal_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {s["requests"]}')
+
+        for name, key, kind, help_text in (
+            ('meal_db_statements_total', 'statements', 'counter', 'SQL statements executed by endpoint.'),
+            ('meal_db_duration_seconds_total', 'db_time', 'counter', 'Time spent in SQL statements by endpoint.'),
+            ('meal_query_budget_exceeded_total', 'budget_exceeded', 'counter', 'Requests exceeding QUERY_BUDGET by endpoint.')
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, s in sorted(snapshot.items()):
+                value = f'{s[key]:.6f}' if isinstance(s[key], float) else s[key]
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _denied(self):
+        """监控接口含SQL语句文本：需提供 METRICS_TOKEN（Prometheus bearer_token），或以管理员账号登录；通过时返回 None"""
+        from utils.security import get_current_user, ROLE_PERMISSIONS
+
+        if self.metrics_token and hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                      f'Bearer {self.metrics_token}'):
+            return None
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        if 'init' not in ROLE_PERMISSIONS.get(user.role, []):
+            return jsonify({'error': 'Permission denied'}), 403
+        return None
+
+    def metrics_view(self):
+        denied = self._denied()
+        if denied:
+            return denied
+        return Response(self.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    def slow_queries_view(self):
+        denied = self._denied()
+        if denied:
+            return denied
+        return jsonify({endpoint: [{'duration_ms': round(elapsed * 1000, 3), 'statement': statement[:1000]}
+                                   for elapsed, statement in s['slowest']]
+                        for endpoint, s in self.snapshot().items()})
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,152 @@
+from extensions import db
+from models import MenuCategory, Dish, BasicMenu, DailyMenu, DailyMenuDish
+from utils.change_tracking import track_commits
+from sqlalchemy import func, select
+from datetime import date, timedelta
+import threading
+import time
+
+MENU_SOURCE_MODELS = (MenuCategory, Dish, BasicMenu, DailyMenu, DailyMenuDish)
+
+
+def _table_signature(model):
+    return [select(agg).scalar_subquery()
+            for agg in (func.count(model.id), func.max(model.id), func.sum(model.version))]
+
+
+class MenuResolver:
+    """日期→菜单解析器：基础餐单按周轮换，每日菜单按分类覆盖
+
+    底层表的版本签名（行数、最大ID、版本号之和）变化时整体重建缓存；
+    本进程内的写入在提交后立即失效缓存，其他进程的写入最迟在 check_interval 秒后生效。
+    """
+
+    def __init__(self):
+        self.rotation_start = date(2024, 1, 1)
+        self.check_interval = 5
+        self._lock = threading.RLock()
+        self._signature = None
+        self._checked_at = 0
+        self._cycle_weeks = 0
+        self._rotation = {}
+        self._overrides = {}
+        self._categories = {}
+        self._resolved = {}
+
+    def init_app(self, app):
+        app.extensions['menu_resolver'] = self
+        self.rotation_start = app.config.get('MENU_ROTATION_START', self.rotation_start)
+        self.check_interval = app.config.get('MENU_CACHE_CHECK_SECONDS', self.check_interval)
+        track_commits('menu_resolver_pending', MENU_SOURCE_MODELS, lambda obj: None,
+                      lambda changes: self.invalidate())
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def _current_signature(self):
+        return tuple(db.session.execute(select(*[col for m in MENU_SOURCE_MODELS for col in _table_signature(m)])).one())
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            signature = self._current_signature()
+            self._checked_at = now
+            if signature == self._signature:
+                return
+            self._load()
+            self._signature = signature
+
+    def _load(self):
+        categories = dict(db.session.query(MenuCategory.id, MenuCategory.name))
+        dish_names = dict(db.session.query(Dish.id, Dish.name))
+        dish_ids_by_name = {}
+        for dish_id, name in sorted(dish_names.items(), reverse=True):
+            dish_ids_by_name[name] = dish_id
+
+        rotation = {}
+        cycle_weeks = 0
+        rows = db.session.query(
+            BasicMenu.week_number, BasicMenu.day_of_week, BasicMenu.category_id,
+            BasicMenu.dish_id, BasicMenu.dish_name
+        ).order_by(BasicMenu.week_number, BasicMenu.day_of_week, BasicMenu.category_id, BasicMenu.id)
+        for week_number, day_of_week, category_id, dish_id, dish_name in rows:
+            dish_id = dish_id or dish_ids_by_name.get(dish_name)
+            rotation.setdefault((week_number, day_of_week), []).append((category_id, dish_id, dish_name))
+            cycle_weeks = max(cycle_weeks, week_number)
+
+        overrides = {}
+        rows = db.session.query(
+            DailyMenu.date, DailyMenuDish.category_id, DailyMenuDish.dish_id, DailyMenuDish.quantity
+        ).join(DailyMenuDish, DailyMenuDish.daily_menu_id == DailyMenu.id).order_by(
+            DailyMenu.date, DailyMenuDish.category_id, DailyMenuDish.id)
+        for menu_date, category_id, dish_id, quantity in rows:
+            overrides.setdefault(menu_date, []).append((category_id, dish_id, dish_names.get(dish_id), quantity))
+
+        self._categories = categories
+        self._cycle_weeks = cycle_weeks
+        self._rotation = {key: tuple(entries) for key, entries in rotation.items()}
+        self._overrides = {key: tuple(entries) for key, entries in overrides.items()}
+        self._resolved = {}
+
+    def rotation_slot(self, day):
+        """计算日期对应的 (轮换周次, 星期)，周次从1开始，星期取日历星期（周一为1）
+
+        轮换周从 rotation_start 所在周的周一算起，rotation_start 不是周一时也不会错位星期
+        """
+        week_start = self.rotation_start - timedelta(days=self.rotation_start.weekday())
+        weeks = (day - week_start).days // 7
+        week_number = weeks % self._cycle_weeks + 1 if self._cycle_weeks else None
+        return week_number, day.isoweekday()
+
+    def _resolve_day(self, day):
+        resolved = self._resolved.get(day)
+        if resolved is not None:
+            return resolved
+
+        week_number, day_of_week = self.rotation_slot(day)
+        overrides = self._overrides.get(day, ())
+        overridden = {category_id for category_id, _, _, _ in overrides}
+
+        dishes = []
+        for category_id, dish_id, dish_name in self._rotation.get((week_number, day_of_week), ()):
+            if category_id not in overridden:
+                dishes.append((category_id, dish_id, dish_name, 1, 'basic_menu'))
+        for category_id, dish_id, dish_name, quantity in overrides:
+            dishes.append((category_id, dish_id, dish_name, quantity, 'daily_menu'))
+        dishes.sort(key=lambda d: (d[0] is None, d[0]))
+
+        resolved = {
+            'date': day.strftime('%Y-%m-%d'),
+            'week_number': week_number,
+            'day_of_week': day_of_week,
+            'dishes': [{
+                'category_id': category_id,
+                'category_name': self._categories.get(category_id, '未知'),
+                'dish_id': dish_id,
+                'dish_name': dish_name,
+                'quantity': quantity,
+                'source': source
+            } for category_id, dish_id, dish_name, quantity, source in dishes]
+        }
+        if len(self._resolved) >= 366:
+            self._resolved.clear()
+        self._resolved[day] = resolved
+        return resolved
+
+    def resolve(self, start_date, end_date=None):
+        """返回 [start_date, end_date] 内每天的有效菜单"""
+        end_date = end_date or start_date
+        self._refresh()
+        with self._lock:
+            days = []
+            day = start_date
+            while day <= end_date:
+                days.append(self._resolve_day(day))
+                day += timedelta(days=1)
+        return days
+
+
+menu_resolver = MenuResolver()
@@ -0,0 +1,152 @@
+from extensions import db
+from models import Customer
+from utils.change_tracking import track_commits
+from utils.tenancy import current_site_id, site_scope
+from datetime import date, timedelta
+from collections import defaultdict
+import calendar
+import threading
+
+
+def stay_range(check_in_date, check_out_date, stay_days):
+    """计算在住区间 [入住日, 离店日)，缺少离店日时按 stay_days 推算；无法确定离店日时返回 (入住日, None)"""
+    if not check_in_date:
+        return None
+    end = check_out_date
+    if end is None and stay_days:
+        end = check_in_date + timedelta(days=stay_days)
+    return check_in_date, end
+
+
+class _SiteOccupancy:
+    """单个站点（或全部站点）按天物化的在住客户索引"""
+
+    def __init__(self):
+        self.stays = {}
+        self.days = defaultdict(set)
+        self.open_stays = {}
+
+    def load(self):
+        rows = db.session.query(
+            Customer.id, Customer.check_in_date, Customer.check_out_date, Customer.stay_days
+        ).filter(Customer.check_in_date.isnot(None))
+        for customer_id, check_in_date, check_out_date, stay_days in rows:
+            self.add(customer_id, stay_range(check_in_date, check_out_date, stay_days))
+
+    def add(self, customer_id, stay):
+        self.remove(customer_id)
+        if not stay:
+            return
+        start, end = stay
+        self.stays[customer_id] = stay
+        if end is None:
+            self.open_stays[customer_id] = start
+            return
+        day = start
+        while day < end:
+            self.days[day].add(customer_id)
+            day += timedelta(days=1)
+
+    def remove(self, customer_id):
+        stay = self.stays.pop(customer_id, None)
+        if not stay:
+            return
+        start, end = stay
+        if end is None:
+            self.open_stays.pop(customer_id, None)
+            return
+        day = start
+        while day < end:
+            ids = self.days.get(day)
+            if ids is not None:
+                ids.discard(customer_id)
+                if not ids:
+                    del self.days[day]
+            day += timedelta(days=1)
+
+    def open_on(self, day):
+        return {customer_id for customer_id, start in self.open_stays.items() if start <= day}
+
+
+class OccupancyCalendar:
+    """客户在住日历：按站点分别缓存的在住客户索引（总部视角为全部站点）"""
+
+    def __init__(self):
+        self._sites = {}
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        app.extensions['occupancy_calendar'] = self
+        track_commits('occupancy_pending', [Customer],
+                      lambda c: (c.site_id, stay_range(c.check_in_date, c.check_out_date, c.stay_days)),
+                      self._apply_changes)
+
+    def _calendar(self):
+        site_id = current_site_id()
+        site_calendar = self._sites.get(site_id)
+        if site_calendar is not None:
+            return site_calendar
+        with self._lock:
+            site_calendar = self._sites.get(site_id)
+            if site_calendar is None:
+                site_calendar = _SiteOccupancy()
+                with site_scope(site_id):
+                    site_calendar.load()
+                self._sites[site_id] = site_calendar
+        return site_calendar
+
+    def _apply_changes(self, changes):
+        with self._lock:
+            for op, model, customer_id, data in changes:
+                for site_id, site_calendar in self._sites.items():
+                    if op == 'delete':
+                        site_calendar.remove(customer_id)
+                    elif site_id is None or site_id == data[0]:
+                        site_calendar.add(customer_id, data[1])
+                    else:
+                        site_calendar.remove(customer_id)
+
+    def rebuild(self):
+        """丢弃全部站点的索引，下次查询时重建"""
+        with self._lock:
+            self._sites = {}
+
+    def customers_on(self, day):
+        """指定日期在住的客户ID列表"""
+        site_calendar = self._calendar()
+        with self._lock:
+            ids = set(site_calendar.days.get(day, ()))
+            ids.update(site_calendar.open_on(day))
+        return sorted(ids)
+
+    def customers_between(self, start_date, end_date):
+        """在 [start_date, end_date] 内任意一天在住的客户ID列表"""
+        site_calendar = self._calendar()
+        ids = set()
+        with self._lock:
+            day = start_date
+            while day <= end_date:
+                ids.update(site_calendar.days.get(day, ()))
+                day += timedelta(days=1)
+            ids.update(site_calendar.open_on(end_date))
+        return sorted(ids)
+
+    def daily_counts(self, start_date, end_date):
+        """[start_date, end_date] 内每天的在住人数"""
+        site_calendar = self._calendar()
+        counts = {}
+        with self._lock:
+            open_starts = list(site_calendar.open_stays.values())
+            day = start_date
+            while day <= end_date:
+                counts[day] = len(site_calendar.days.get(day, ())) + sum(1 for start in open_starts if start <= day)
+                day += timedelta(days=1)
+        return counts
+
+    def month_counts(self, year, month):
+        """整月每天的在住人数"""
+        last_day = calendar.monthrange(year, month)[1]
+        return self.daily_counts(date(year, month, 1), date(year, month, last_day))
+
+
+occupancy_calendar = OccupancyCalendar()
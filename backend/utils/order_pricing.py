@@ -0,0 +1,144 @@
+from extensions import db
+from models import Customer, Dish, CustomerOrder, OrderItem
+from sqlalchemy import select, update, func, exists
+from datetime import datetime
+
+AMOUNT_PRECISION = 2
+
+
+def line_total(price, quantity):
+    """订单明细金额 = 单价 × 数量"""
+    return round((price or 0) * (quantity or 0), AMOUNT_PRECISION)
+
+
+def order_total(items):
+    """订单金额 = 各明细金额之和；items 为带 price/quantity 的对象或字典"""
+    total = 0
+    for item in items:
+        if isinstance(item, dict):
+            total += line_total(item.get('price'), item.get('quantity'))
+        else:
+            total += line_total(item.price, item.quantity)
+    return round(total, AMOUNT_PRECISION)
+
+
+def _normalize_items(items):
+    normalized = []
+    for item in items:
+        try:
+            dish_id = int(item['dish_id'])
+            quantity = int(item.get('quantity', 1))
+            price = float(item.get('price') or 0)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each item requires dish_id, quantity and price')
+        if quantity <= 0 or price < 0:
+            raise ValueError('Item quantity must be positive and price must not be negative')
+        normalized.append({'dish_id': dish_id, 'quantity': quantity, 'price': price})
+    return normalized
+
+
+def create_order(customer_id, items, order_date=None):
+    """创建订单（状态为 pending）：金额由明细计算，明细以一条批量 INSERT 写入（调用方负责提交）
+
+    items: [{'dish_id': int, 'quantity': int, 'price': float}]
+    """
+    if not items:
+        raise ValueError('Order requires at least one item')
+    items = _normalize_items(items)
+
+    customer = db.session.query(Customer.id, Customer.site_id).filter(Customer.id == customer_id).first()
+    if not customer:
+        raise ValueError(f'Customer {customer_id} not found')
+    dish_ids = {item['dish_id'] for item in items}
+    found = {dish_id for (dish_id,) in db.session.query(Dish.id).filter(Dish.id.in_(dish_ids))}
+    missing = sorted(dish_ids - found)
+    if missing:
+        raise ValueError(f'Dishes not found: {missing}')
+
+    order = CustomerOrder(
+        customer_id=customer_id,
+        site_id=customer.site_id,
+        order_date=order_date or datetime.now().date(),
+        status='pending',
+        total_amount=order_total(items)
+    )
+    db.session.add(order)
+    db.session.flush()
+
+    db.session.execute(OrderItem.__table__.insert(), [
+        {'order_id': order.id, 'version': 1, **item} for item in items
+    ])
+    return order
+
+
+def _date_filters(column, start_date, end_date):
+    filters = []
+    if start_date:
+        filters.append(column >= start_date)
+    if end_date:
+        filters.append(column <= end_date)
+    return filters
+
+
+def _line_amount():
+    return func.coalesce(OrderItem.price, 0) * OrderItem.quantity
+
+
+def _reconcile_update_from(start_date, end_date):
+    totals = select(
+        OrderItem.order_id.label('order_id'),
+        func.round(func.sum(_line_amount()), AMOUNT_PRECISION).label('total')
+    ).join(CustomerOrder, CustomerOrder.id == OrderItem.order_id).where(
+        *_date_filters(CustomerOrder.order_date, start_date, end_date)
+    ).group_by(OrderItem.order_id).subquery()
+
+    mismatched = db.session.execute(
+        update(CustomerOrder).where(
+            CustomerOrder.id == totals.c.order_id,
+            func.abs(func.coalesce(CustomerOrder.total_amount, 0) - totals.c.total) >= 0.005
+        ).values(
+            total_amount=totals.c.total,
+            version=CustomerOrder.version + 1
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+    emptied = db.session.execute(
+        update(CustomerOrder).where(
+            *_date_filters(CustomerOrder.order_date, start_date, end_date),
+            ~exists().where(OrderItem.order_id == CustomerOrder.id),
+            func.coalesce(CustomerOrder.total_amount, 0) != 0
+        ).values(
+            total_amount=0,
+            version=CustomerOrder.version + 1
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+    return mismatched + emptied
+
+
+def _reconcile_correlated(start_date, end_date):
+    total = select(
+        func.coalesce(func.round(func.sum(_line_amount()), AMOUNT_PRECISION), 0)
+    ).where(OrderItem.order_id == CustomerOrder.id).scalar_subquery()
+
+    return db.session.execute(
+        update(CustomerOrder).where(
+            *_date_filters(CustomerOrder.order_date, start_date, end_date),
+            func.abs(func.coalesce(CustomerOrder.total_amount, 0) - total) >= 0.005
+        ).values(
+            total_amount=total,
+            version=CustomerOrder.version + 1
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def reconcile_order_totals(start_date=None, end_date=None):
+    """按日期区间将订单金额重算为明细合计（调用方负责提交）
+
+    聚合子查询按 order_id 一次性汇总明细，再以一条 UPDATE ... FROM（MySQL 为多表 UPDATE）
+    只改写金额不一致的订单，没有明细的订单金额归零；SQLite 不支持该语法，改用相关子查询。
+    返回修正的订单数。
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return _reconcile_correlated(start_date, end_date)
+    return _reconcile_update_from(start_date, end_date)
@@ -0,0 +1,65 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+
+
+class HasherBusy(Exception):
+    """哈希任务排队已满"""
+
+
+class PasswordHasher:
+    """在有界进程池中计算密码哈希（PBKDF2），避免登录高峰占满请求线程的 CPU
+
+    同时排队的任务数不超过 max_pending，超出时等待 queue_timeout 秒后抛出 HasherBusy，
+    由接口返回 503 让客户端稍后重试。workers 为 0 时在当前线程同步计算。
+    子进程以 spawn 方式启动，会重新导入主模块，启动脚本须有 if __name__ == '__main__' 保护。
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.queue_timeout = 2
+        self._slots = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 2) // 2, 1))
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2)
+        max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.workers * 4) or 1
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _pool(self):
+        # 延迟创建；不 fork 带有线程、数据库连接的服务进程
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy('Too many concurrent password operations')
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,182 @@
+from extensions import db
+from models import (Customer, ConfinementMealPlan, ConfinementWeekPlan, ConfinementDayPlan,
+                    ConfinementMealItem, ConfinementPlanTemplate, ConfinementPlanTemplateItem)
+from utils.restrictions import customer_restrictions, conflicts
+from utils.reference_data import reference_data
+from datetime import timedelta
+
+
+def save_plan_as_template(plan_id, name, description=None, created_by=None):
+    """将已有月子餐计划保存为模板（调用方负责提交）"""
+    plan = ConfinementMealPlan.query.get(plan_id)
+    if not plan:
+        raise ValueError(f'Confinement meal plan {plan_id} not found')
+
+    rows = db.session.query(
+        ConfinementWeekPlan.week_number, ConfinementDayPlan.day_of_week,
+        ConfinementMealItem.category_id, ConfinementMealItem.dish_id
+    ).join(ConfinementDayPlan, ConfinementDayPlan.week_plan_id == ConfinementWeekPlan.id
+    ).join(ConfinementMealItem, ConfinementMealItem.day_plan_id == ConfinementDayPlan.id
+    ).filter(ConfinementWeekPlan.meal_plan_id == plan_id).all()
+    if not rows:
+        raise ValueError(f'Confinement meal plan {plan_id} has no meal items')
+
+    template = ConfinementPlanTemplate(
+        name=name,
+        description=description,
+        weeks=max(row.week_number for row in rows),
+        type=plan.type,
+        created_by=created_by
+    )
+    db.session.add(template)
+    db.session.flush()
+
+    db.session.execute(ConfinementPlanTemplateItem.__table__.insert(), [{
+        'template_id': template.id,
+        'week_number': week_number,
+        'day_of_week': day_of_week,
+        'category_id': category_id,
+        'dish_id': dish_id,
+        'version': 1
+    } for week_number, day_of_week, category_id, dish_id in rows])
+
+    return template
+
+
+class _DishSubstituter:
+    """按客户禁忌为冲突菜品挑选同分类替代菜品；与禁忌合规检查使用同一套菜品标记和命中规则"""
+
+    def __init__(self):
+        reference = reference_data.current()
+        self.restrictions = reference.dish_tokens()
+        self.by_category = reference.dishes_by_category
+        self._cache = {}
+
+    def resolve(self, customer_restrictions, dish_id, category_id, used):
+        if not customer_restrictions or not conflicts(customer_restrictions, self.restrictions.get(dish_id, frozenset())):
+            return dish_id
+
+        key = (customer_restrictions, category_id)
+        candidates = self._cache.get(key)
+        if candidates is None:
+            candidates = [d for d in self.by_category.get(category_id, [])
+                          if not conflicts(customer_restrictions, self.restrictions[d])]
+            self._cache[key] = candidates
+        if not candidates:
+            return None
+
+        for candidate in candidates:
+            if candidate not in used:
+                return candidate
+        return candidates[0]
+
+
+def instantiate_template(template_id, assignments):
+    """按模板为多位客户批量生成月子餐计划（调用方负责提交）
+
+    assignments: [{'customer_id': int, 'start_date': date, 'type': str(可选)}]
+    整个计划层级通过少量批量 INSERT 写入，不逐个 flush ORM 对象。
+    """
+    template = ConfinementPlanTemplate.query.get(template_id)
+    if not template:
+        raise ValueError(f'Template {template_id} not found')
+    if not assignments:
+        return {'plans': [], 'substitutions': [], 'unresolved': []}
+
+    items = db.session.query(
+        ConfinementPlanTemplateItem.week_number, ConfinementPlanTemplateItem.day_of_week,
+        ConfinementPlanTemplateItem.category_id, ConfinementPlanTemplateItem.dish_id
+    ).filter(ConfinementPlanTemplateItem.template_id == template_id).order_by(
+        ConfinementPlanTemplateItem.week_number, ConfinementPlanTemplateItem.day_of_week,
+        ConfinementPlanTemplateItem.id
+    ).all()
+
+    customer_ids = [a['customer_id'] for a in assignments]
+    if len(set(customer_ids)) != len(customer_ids):
+        raise ValueError('Duplicate customer_id in assignments')
+
+    customers = {customer_id: (customer_restrictions(restrictions, health_conditions), site_id)
+                 for customer_id, restrictions, health_conditions, site_id in db.session.query(
+        Customer.id, Customer.restrictions, Customer.health_conditions, Customer.site_id
+    ).filter(Customer.id.in_(customer_ids))}
+    missing = [cid for cid in customer_ids if cid not in customers]
+    if missing:
+        raise ValueError(f'Customers not found: {missing}')
+
+    existing = [cid for (cid,) in db.session.query(ConfinementMealPlan.customer_id).filter(
+        ConfinementMealPlan.customer_id.in_(customer_ids))]
+    if existing:
+        raise ValueError(f'Customers already have a confinement meal plan: {existing}')
+
+    db.session.execute(ConfinementMealPlan.__table__.insert(), [{
+        'customer_id': a['customer_id'],
+        'site_id': customers[a['customer_id']][1],
+        'start_date': a['start_date'],
+        'end_date': a['start_date'] + timedelta(days=template.weeks * 7 - 1),
+        'status': 'active',
+        'type': a.get('type') or template.type,
+        'version': 1
+    } for a in assignments])
+    plan_ids = dict(db.session.query(ConfinementMealPlan.customer_id, ConfinementMealPlan.id).filter(
+        ConfinementMealPlan.customer_id.in_(customer_ids)))
+
+    week_numbers = sorted({item.week_number for item in items})
+    day_keys = sorted({(item.week_number, item.day_of_week) for item in items})
+    all_plan_ids = list(plan_ids.values())
+
+    db.session.execute(ConfinementWeekPlan.__table__.insert(), [
+        {'meal_plan_id': plan_id, 'week_number': week_number, 'version': 1}
+        for plan_id in all_plan_ids for week_number in week_numbers
+    ])
+    week_ids = {(plan_id, week_number): week_id for week_id, plan_id, week_number in db.session.query(
+        ConfinementWeekPlan.id, ConfinementWeekPlan.meal_plan_id, ConfinementWeekPlan.week_number
+    ).filter(ConfinementWeekPlan.meal_plan_id.in_(all_plan_ids))}
+
+    db.session.execute(ConfinementDayPlan.__table__.insert(), [
+        {'week_plan_id': week_ids[(plan_id, week_number)], 'day_of_week': day_of_week, 'version': 1}
+        for plan_id in all_plan_ids for week_number, day_of_week in day_keys
+    ])
+    day_ids = {(week_id, day_of_week): day_id for day_id, week_id, day_of_week in db.session.query(
+        ConfinementDayPlan.id, ConfinementDayPlan.week_plan_id, ConfinementDayPlan.day_of_week
+    ).filter(ConfinementDayPlan.week_plan_id.in_(list(week_ids.values())))}
+
+    template_dishes_by_day = {}
+    for item in items:
+        template_dishes_by_day.setdefault((item.week_number, item.day_of_week), set()).add(item.dish_id)
+
+    substituter = _DishSubstituter()
+    meal_items, substitutions, unresolved = [], [], []
+    for customer_id in customer_ids:
+        plan_id = plan_ids[customer_id]
+        restrictions = customers[customer_id][0]
+        used_by_day = {}
+        for week_number, day_of_week, category_id, dish_id in items:
+            day_key = (week_number, day_of_week)
+            if day_key not in used_by_day:
+                used_by_day[day_key] = set(template_dishes_by_day[day_key])
+            used = used_by_day[day_key]
+            resolved = substituter.resolve(restrictions, dish_id, category_id, used)
+            if resolved is None:
+                unresolved.append({'customer_id': customer_id, 'week_number': week_number,
+                                   'day_of_week': day_of_week, 'dish_id': dish_id})
+                continue
+            if resolved != dish_id:
+                substitutions.append({'customer_id': customer_id, 'week_number': week_number,
+                                      'day_of_week': day_of_week, 'original_dish_id': dish_id,
+                                      'dish_id': resolved})
+            used.add(resolved)
+            meal_items.append({
+                'day_plan_id': day_ids[(week_ids[(plan_id, week_number)], day_of_week)],
+                'category_id': category_id,
+                'dish_id': resolved,
+                'version': 1
+            })
+
+    if meal_items:
+        db.session.execute(ConfinementMealItem.__table__.insert(), meal_items)
+
+    return {
+        'plans': [{'customer_id': cid, 'plan_id': plan_ids[cid]} for cid in customer_ids],
+        'substitutions': substitutions,
+        'unresolved': unresolved
+    }
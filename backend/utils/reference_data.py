@@ -0,0 +1,204 @@
+from extensions import db
+from models import MenuCategory, Dish, Ingredient, DishIngredient, ServiceCategory, ServiceItem
+from utils.change_tracking import track_commits
+from utils.menu_resolver import _table_signature
+from utils.restrictions import parse_restrictions
+from sqlalchemy import select
+import threading
+import time
+
+
+class CategoryRecord:
+    __slots__ = ('id', 'name', 'description')
+
+    def __init__(self, id, name, description):
+        self.id = id
+        self.name = name
+        self.description = description
+
+
+class DishRecord:
+    __slots__ = ('id', 'name', 'category_id', 'ingredients', 'restrictions', 'restriction_set')
+
+    def __init__(self, id, name, category_id, ingredients, restrictions):
+        self.id = id
+        self.name = name
+        self.category_id = category_id
+        self.ingredients = ingredients
+        self.restrictions = restrictions
+        self.restriction_set = parse_restrictions(restrictions)
+
+
+class IngredientRecord:
+    """食材基础信息；库存变化频繁，不放入快照"""
+    __slots__ = ('id', 'name', 'description', 'unit', 'nutrition_info', 'calorie', 'shelf_life', 'image_url')
+
+    def __init__(self, id, name, description, unit, nutrition_info, calorie, shelf_life, image_url):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.unit = unit
+        self.nutrition_info = nutrition_info
+        self.calorie = calorie
+        self.shelf_life = shelf_life
+        self.image_url = image_url
+
+
+class ServiceItemRecord:
+    __slots__ = ('id', 'name', 'description', 'category_id', 'duration', 'price')
+
+    def __init__(self, id, name, description, category_id, duration, price):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.category_id = category_id
+        self.duration = duration
+        self.price = price
+
+
+def _load_menu_categories():
+    return {row.id: CategoryRecord(*row) for row in db.session.query(
+        MenuCategory.id, MenuCategory.name, MenuCategory.description)}
+
+
+def _load_dishes():
+    return {row.id: DishRecord(*row) for row in db.session.query(
+        Dish.id, Dish.name, Dish.category_id, Dish.ingredients, Dish.restrictions).order_by(Dish.id)}
+
+
+def _load_ingredients():
+    return {row.id: IngredientRecord(*row) for row in db.session.query(
+        Ingredient.id, Ingredient.name, Ingredient.description, Ingredient.unit, Ingredient.nutrition_info,
+        Ingredient.calorie, Ingredient.shelf_life, Ingredient.image_url)}
+
+
+def _load_recipes():
+    recipes = {}
+    for dish_id, ingredient_id, quantity in db.session.query(
+            DishIngredient.dish_id, DishIngredient.ingredient_id, DishIngredient.quantity).order_by(DishIngredient.id):
+        recipes.setdefault(dish_id, []).append((ingredient_id, quantity))
+    return {dish_id: tuple(items) for dish_id, items in recipes.items()}
+
+
+def _load_service_categories():
+    return {row.id: CategoryRecord(*row) for row in db.session.query(
+        ServiceCategory.id, ServiceCategory.name, ServiceCategory.description)}
+
+
+def _load_service_items():
+    return {row.id: ServiceItemRecord(*row) for row in db.session.query(
+        ServiceItem.id, ServiceItem.name, ServiceItem.description, ServiceItem.category_id,
+        ServiceItem.duration, ServiceItem.price)}
+
+
+# 快照字段 -> (来源表, 加载函数)
+_SECTIONS = {
+    'menu_categories': (MenuCategory, _load_menu_categories),
+    'dishes': (Dish, _load_dishes),
+    'ingredients': (Ingredient, _load_ingredients),
+    'recipes': (DishIngredient, _load_recipes),
+    'service_categories': (ServiceCategory, _load_service_categories),
+    'service_items': (ServiceItem, _load_service_items),
+}
+REFERENCE_MODELS = tuple(model for model, _ in _SECTIONS.values())
+
+
+class ReferenceSnapshot:
+    """某一时刻的基础数据只读快照，生成后不再修改"""
+    __slots__ = ('signature', 'menu_categories', 'dishes', 'ingredients', 'recipes',
+                 'service_categories', 'service_items', 'dishes_by_category', '_dish_tokens')
+
+    def __init__(self, signature, sections):
+        self.signature = signature
+        for name, records in sections.items():
+            setattr(self, name, records)
+        by_category = {}
+        for dish in self.dishes.values():
+            by_category.setdefault(dish.category_id, []).append(dish.id)
+        self.dishes_by_category = {category_id: tuple(ids) for category_id, ids in by_category.items()}
+        self._dish_tokens = None
+
+    def dish(self, dish_id):
+        return self.dishes.get(dish_id)
+
+    def ingredient(self, ingredient_id):
+        return self.ingredients.get(ingredient_id)
+
+    def service_item(self, service_item_id):
+        return self.service_items.get(service_item_id)
+
+    def category_name(self, category_id, default=None):
+        category = self.menu_categories.get(category_id)
+        return category.name if category else default
+
+    def dish_category_name(self, dish_id, default=None):
+        dish = self.dishes.get(dish_id)
+        return self.category_name(dish.category_id, default) if dish else default
+
+    def recipe(self, dish_id):
+        """菜品配方：((食材ID, 用量), ...)"""
+        return self.recipes.get(dish_id, ())
+
+    def dish_tokens(self):
+        """菜品ID -> 禁忌标记、食材文本及配方食材名称的规范化标记集合（首次调用时生成）"""
+        if self._dish_tokens is None:
+            tokens = {}
+            for dish in self.dishes.values():
+                names = [self.ingredients[i].name for i, _ in self.recipe(dish.id) if i in self.ingredients]
+                tokens[dish.id] = dish.restriction_set | parse_restrictions(dish.ingredients) | parse_restrictions(names)
+            self._dish_tokens = tokens
+        return self._dish_tokens
+
+
+class ReferenceData:
+    """菜单分类、菜品、食材、服务项目等基础数据的进程级只读快照
+
+    每张表的版本签名（行数、最大ID、版本号之和）变化时只重新加载该表，组装新快照后整体替换引用，
+    读取方拿到的快照始终完整一致。本进程内的写入在提交后立即失效，其他进程的写入最迟 check_interval 秒后生效。
+    """
+
+    def __init__(self):
+        self.check_interval = 5
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stale = True
+        self._checked_at = 0
+
+    def init_app(self, app):
+        app.extensions['reference_data'] = self
+        self.check_interval = app.config.get('REFERENCE_DATA_CHECK_SECONDS', self.check_interval)
+        track_commits('reference_data_pending', REFERENCE_MODELS, lambda obj: None,
+                      lambda changes: self.invalidate())
+
+    def invalidate(self):
+        self._stale = True
+
+    def _current_signature(self):
+        columns = [col for model in REFERENCE_MODELS for col in _table_signature(model)]
+        values = tuple(db.session.execute(select(*columns)).one())
+        return {name: values[i * 3:i * 3 + 3] for i, name in enumerate(_SECTIONS)}
+
+    def current(self):
+        """返回最新快照；调用方在一次处理中应持有同一个快照"""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not self._stale and time.monotonic() - self._checked_at < self.check_interval:
+                return snapshot
+            self._stale = False
+            signature = self._current_signature()
+            if snapshot is None or signature != snapshot.signature:
+                sections = {}
+                for name, (model, load) in _SECTIONS.items():
+                    unchanged = snapshot is not None and signature[name] == snapshot.signature[name]
+                    sections[name] = getattr(snapshot, name) if unchanged else load()
+                snapshot = ReferenceSnapshot(signature, sections)
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return snapshot
+
+
+reference_data = ReferenceData()
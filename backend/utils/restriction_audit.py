@@ -0,0 +1,128 @@
+from extensions import db
+from models import (Customer, MealSchedule, MealScheduleItem, ConfinementMealPlan, ConfinementWeekPlan,
+                    ConfinementDayPlan, ConfinementMealItem)
+from utils.reference_data import reference_data
+from utils.restrictions import customer_restrictions, matches
+from sqlalchemy import or_
+import numpy as np
+
+_WORD_BITS = 64
+
+
+def _bitsets(token_sets, codes, matcher):
+    """每行一个位集（uint64 字数组），第 i 位表示命中第 i 个禁忌编码"""
+    bits = np.zeros((len(token_sets), max(1, -(-len(codes) // _WORD_BITS))), dtype=np.uint64)
+    for row, tokens in enumerate(token_sets):
+        for i, code in enumerate(codes):
+            if matcher(code, tokens):
+                bits[row, i // _WORD_BITS] |= np.uint64(1 << (i % _WORD_BITS))
+    return bits
+
+
+def _decode(bits, codes):
+    return [code for i, code in enumerate(codes) if int(bits[i // _WORD_BITS]) >> (i % _WORD_BITS) & 1]
+
+
+def _schedule_items(start_date, end_date, schedule_id):
+    query = db.session.query(
+        MealScheduleItem.id, MealScheduleItem.customer_id, MealScheduleItem.dish_id, MealSchedule.date
+    ).join(MealSchedule, MealSchedule.id == MealScheduleItem.schedule_id)
+    if schedule_id is not None:
+        query = query.filter(MealScheduleItem.schedule_id == schedule_id)
+    else:
+        query = query.filter(MealSchedule.date >= start_date, MealSchedule.date <= end_date)
+    return query.all()
+
+
+def _plan_items(start_date, end_date):
+    rows = db.session.query(
+        ConfinementMealItem.id, ConfinementMealPlan.customer_id, ConfinementMealItem.dish_id,
+        ConfinementMealPlan.start_date, ConfinementWeekPlan.week_number, ConfinementDayPlan.day_of_week
+    ).join(ConfinementDayPlan, ConfinementDayPlan.id == ConfinementMealItem.day_plan_id
+    ).join(ConfinementWeekPlan, ConfinementWeekPlan.id == ConfinementDayPlan.week_plan_id
+    ).join(ConfinementMealPlan, ConfinementMealPlan.id == ConfinementWeekPlan.meal_plan_id).filter(
+        ConfinementMealPlan.status == 'active',
+        ConfinementMealPlan.start_date <= end_date,
+        or_(ConfinementMealPlan.end_date.is_(None), ConfinementMealPlan.end_date >= start_date)
+    ).all()
+    if not rows:
+        return []
+
+    # 计划日期 = 开始日期 + (周次 - 1) * 7 + (星期 - 1)
+    ids, customer_ids, dish_ids, plan_starts, weeks, days = zip(*rows)
+    dates = (np.array(plan_starts, dtype='datetime64[D]')
+             + (np.array(weeks) - 1) * 7 + (np.array(days) - 1))
+    keep = np.flatnonzero((dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date)))
+    return [(ids[i], customer_ids[i], dish_ids[i], dates[i].item()) for i in keep]
+
+
+def audit_restrictions(start_date, end_date, schedule_id=None, include_plans=True):
+    """校验区间内排餐明细与月子餐计划单项是否与客户禁忌冲突，按客户分组返回冲突
+
+    客户禁忌（restrictions 与 health_conditions）和菜品标记（禁忌标记、食材文本、配方食材名称）各自规范化一次，
+    以客户禁忌编码建立位集，全部单项在一次向量化运算中完成匹配；命中规则与生成月子餐计划时的替代菜品相同（utils.restrictions.matches）。
+    指定 schedule_id 时只校验该排餐表（用于发布前检查）。
+    """
+    items = [('meal_schedule', row.id, row.customer_id, row.dish_id, row.date)
+             for row in _schedule_items(start_date, end_date, schedule_id)]
+    if include_plans and schedule_id is None:
+        items += [('confinement_plan', *row) for row in _plan_items(start_date, end_date)]
+
+    result = {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'checked_items': len(items),
+        'violation_count': 0,
+        'customers': []
+    }
+    if not items:
+        return result
+
+    customer_ids = np.array([item[2] for item in items])
+    dish_ids = np.array([item[3] for item in items])
+    customer_keys, customer_idx = np.unique(customer_ids, return_inverse=True)
+    dish_keys, dish_idx = np.unique(dish_ids, return_inverse=True)
+
+    customers = {}
+    for customer_id, name, restrictions, health_conditions in db.session.query(
+            Customer.id, Customer.name, Customer.restrictions, Customer.health_conditions
+    ).filter(Customer.id.in_(customer_keys.tolist())):
+        customers[customer_id] = (name, customer_restrictions(restrictions, health_conditions))
+
+    customer_tokens = [customers.get(c, (None, frozenset()))[1] for c in customer_keys.tolist()]
+    codes = sorted(set().union(*customer_tokens))
+    if not codes:
+        return result
+
+    reference = reference_data.current()
+    dish_tokens = reference.dish_tokens()
+    customer_bits = _bitsets(customer_tokens, codes, lambda code, tokens: code in tokens)
+    dish_bits = _bitsets([dish_tokens.get(d, frozenset()) for d in dish_keys.tolist()], codes, matches)
+
+    hits = customer_bits[customer_idx] & dish_bits[dish_idx]
+    flagged = np.flatnonzero(hits.any(axis=1))
+
+    grouped = {}
+    for i in flagged.tolist():
+        source, item_id, customer_id, dish_id, day = items[i]
+        dish = reference.dish(dish_id)
+        grouped.setdefault(customer_id, []).append({
+            'source': source,
+            'item_id': item_id,
+            'date': day.strftime('%Y-%m-%d'),
+            'dish_id': dish_id,
+            'dish_name': dish.name if dish else None,
+            'conflicts': _decode(hits[i], codes)
+        })
+
+    for customer_id in sorted(grouped):
+        violations = sorted(grouped[customer_id], key=lambda v: (v['date'], v['source'], v['item_id']))
+        name, tokens = customers.get(customer_id, (None, frozenset()))
+        result['customers'].append({
+            'customer_id': customer_id,
+            'customer_name': name,
+            'restrictions': sorted(tokens),
+            'violations': violations
+        })
+    result['violation_count'] = int(len(flagged))
+    return result
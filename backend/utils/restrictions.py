@@ -0,0 +1,45 @@
+import re
+
+_SEPARATORS = re.compile(r'[,，、;；/|\s]+')
+
+
+def parse_restrictions(value):
+    """将饮食禁忌文本（或列表）拆分为规范化的标记集合"""
+    if not value:
+        return frozenset()
+    if isinstance(value, str):
+        tokens = _SEPARATORS.split(value)
+    else:
+        tokens = value
+    return frozenset(str(t).strip().lower() for t in tokens if t and str(t).strip())
+
+
+# health_conditions（JSON 对象）中记录饮食禁忌的字段；其余字段是病史等自由文本，不作为禁忌
+HEALTH_RESTRICTION_KEYS = ('restrictions', 'dietary_restrictions', 'allergies', '饮食禁忌', '过敏')
+
+
+def health_condition_tokens(value):
+    """健康状况（JSON）中的禁忌标记：只读取 HEALTH_RESTRICTION_KEYS 字段（文本或列表）"""
+    if not isinstance(value, dict):
+        return frozenset()
+    tokens = set()
+    for key in HEALTH_RESTRICTION_KEYS:
+        item = value.get(key)
+        if isinstance(item, (str, list, tuple)):
+            tokens |= parse_restrictions(item)
+    return frozenset(tokens)
+
+
+def customer_restrictions(restrictions, health_conditions=None):
+    """客户禁忌编码：restrictions 文本与 health_conditions 中的禁忌标记"""
+    return parse_restrictions(restrictions) | health_condition_tokens(health_conditions)
+
+
+def matches(code, dish_tokens):
+    """菜品标记（禁忌标记、食材，见 ReferenceSnapshot.dish_tokens）包含禁忌编码即视为命中，如“花生油”含“花生”"""
+    return any(code in token for token in dish_tokens)
+
+
+def conflicts(customer_restrictions, dish_tokens):
+    """客户任一禁忌编码命中菜品标记即视为冲突"""
+    return any(matches(code, dish_tokens) for code in customer_restrictions)
@@ -0,0 +1,128 @@
+from extensions import db
+from models import CustomerOrder, OrderItem, SalesDailyRollup
+from utils.archive import needs_archive
+from utils.reference_data import reference_data
+from sqlalchemy import func
+from datetime import datetime, timedelta
+import numpy as np
+
+
+def fit_predict(matrix, start_date, alpha=0.3, horizon=7):
+    """对 (序列 × 天) 矩阵整体拟合星期季节性 + 简单指数平滑，返回未来 horizon 天的预测"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n, t = matrix.shape
+    if n == 0 or t == 0:
+        return np.zeros((n, horizon))
+
+    dow = (np.arange(t) + start_date.weekday()) % 7
+    dow_onehot = np.eye(7)[dow]
+    dow_counts = np.maximum(dow_onehot.sum(axis=0), 1)
+
+    weekday_mean = (matrix @ dow_onehot) / dow_counts
+    overall_mean = matrix.mean(axis=1, keepdims=True)
+    seasonal = np.divide(weekday_mean, overall_mean,
+                         out=np.ones_like(weekday_mean), where=overall_mean > 0)
+
+    seasonal_t = seasonal[:, dow]
+    safe = np.where(seasonal_t > 0, seasonal_t, 1)
+    deseasonalized = np.where(seasonal_t > 0, matrix / safe, overall_mean)
+
+    # 以首日为初始水平的指数平滑，展开为一次加权求和
+    weights = alpha * (1 - alpha) ** np.arange(t - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (t - 1)
+    level = deseasonalized @ weights
+
+    future_dow = (np.arange(t, t + horizon) + start_date.weekday()) % 7
+    return np.clip(level[:, None] * seasonal[:, future_dow], 0, None)
+
+
+class SalesForecaster:
+    """菜品及分类销量预测器"""
+
+    def __init__(self, history_days=365, horizon=7, alpha=0.3):
+        self.history_days = history_days
+        self.horizon = horizon
+        self.alpha = alpha
+
+    def load_history(self, end_date):
+        """加载 菜品 × 天 销量矩阵"""
+        start_date = end_date - timedelta(days=self.history_days - 1)
+
+        dishes = [(dish.id, dish.name, dish.category_id) for dish in reference_data.current().dishes.values()]
+        dish_index = {dish_id: i for i, (dish_id, _, _) in enumerate(dishes)}
+
+        rows = db.session.query(
+            CustomerOrder.order_date, OrderItem.dish_id, func.sum(OrderItem.quantity)
+        ).join(OrderItem, OrderItem.order_id == CustomerOrder.id).filter(
+            CustomerOrder.order_date >= start_date,
+            CustomerOrder.order_date <= end_date
+        ).group_by(CustomerOrder.order_date, OrderItem.dish_id).all()
+        if needs_archive(CustomerOrder.__tablename__, start_date):
+            # 已归档的订单只保留每日汇总
+            rows += db.session.query(
+                SalesDailyRollup.date, SalesDailyRollup.dish_id, func.sum(SalesDailyRollup.quantity)
+            ).filter(
+                SalesDailyRollup.date >= start_date,
+                SalesDailyRollup.date <= end_date
+            ).group_by(SalesDailyRollup.date, SalesDailyRollup.dish_id).all()
+
+        matrix = np.zeros((len(dishes), self.history_days))
+        if rows:
+            row_idx, col_idx, qty = [], [], []
+            for order_date, dish_id, quantity in rows:
+                if dish_id in dish_index:
+                    row_idx.append(dish_index[dish_id])
+                    col_idx.append((order_date - start_date).days)
+                    qty.append(quantity or 0)
+            np.add.at(matrix, (np.array(row_idx, dtype=np.intp), np.array(col_idx, dtype=np.intp)), qty)
+
+        return dishes, matrix, start_date
+
+    def forecast(self, end_date=None):
+        """预测未来 horizon 天各菜品、各分类的销量（份）"""
+        end_date = end_date or datetime.now().date()
+        dishes, matrix, start_date = self.load_history(end_date)
+
+        categories = {category_id: category.name
+                      for category_id, category in reference_data.current().menu_categories.items()}
+        category_ids = sorted({category_id for _, _, category_id in dishes}, key=lambda c: (c is None, c))
+        category_index = {category_id: i for i, category_id in enumerate(category_ids)}
+        dish_category = np.array([category_index[c] for _, _, c in dishes], dtype=np.intp)
+
+        category_matrix = np.zeros((len(category_ids), matrix.shape[1]))
+        if len(dishes):
+            np.add.at(category_matrix, dish_category, matrix)
+
+        dish_pred = fit_predict(matrix, start_date, self.alpha, self.horizon)
+        category_pred = fit_predict(category_matrix, start_date, self.alpha, self.horizon)
+
+        forecast_dates = [(end_date + timedelta(days=i + 1)).strftime('%Y-%m-%d') for i in range(self.horizon)]
+
+        dish_forecast = []
+        for i, (dish_id, name, category_id) in enumerate(dishes):
+            dish_forecast.append({
+                'dish_id': dish_id,
+                'dish_name': name,
+                'category': categories.get(category_id, '未知'),
+                'predicted_portions': np.round(dish_pred[i], 1).tolist(),
+                'total_predicted': round(float(dish_pred[i].sum()), 1)
+            })
+        dish_forecast.sort(key=lambda x: x['total_predicted'], reverse=True)
+
+        category_forecast = []
+        for i, category_id in enumerate(category_ids):
+            category_forecast.append({
+                'category_id': category_id,
+                'category_name': categories.get(category_id, '未知'),
+                'predicted_portions': np.round(category_pred[i], 1).tolist(),
+                'total_predicted': round(float(category_pred[i].sum()), 1)
+            })
+        category_forecast.sort(key=lambda x: x['total_predicted'], reverse=True)
+
+        return {
+            'history_start': start_date.strftime('%Y-%m-%d'),
+            'history_end': end_date.strftime('%Y-%m-%d'),
+            'forecast_dates': forecast_dates,
+            'dish_forecast': dish_forecast,
+            'category_forecast': category_forecast
+        }
@@ -0,0 +1,157 @@
+from extensions import db
+from models import Dish, Ingredient, Customer, SiteScopedMixin
+from utils.change_tracking import track_commits
+from utils.tenancy import current_site_id, site_scope
+from pypinyin import lazy_pinyin, Style
+from collections import defaultdict
+import threading
+
+SEARCH_ENTITIES = {
+    'dish': Dish,
+    'ingredient': Ingredient,
+    'customer': Customer
+}
+
+_MODEL_ENTITIES = {model: entity for entity, model in SEARCH_ENTITIES.items()}
+
+
+def _search_keys(name):
+    """生成名称的检索键：原文、拼音全拼、拼音首字母"""
+    name = (name or '').strip().lower()
+    if not name:
+        return ()
+    full = ''.join(lazy_pinyin(name)).lower()
+    initials = ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return tuple(dict.fromkeys(k for k in (name, full, initials) if k))
+
+
+def _grams(text):
+    """单字与二元切分"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class _EntityIndex:
+    """单个实体的 n-gram 倒排索引"""
+
+    def __init__(self):
+        self.names = {}
+        self.keys = {}
+        self.postings = defaultdict(set)
+
+    def add(self, obj_id, name):
+        self.remove(obj_id)
+        keys = _search_keys(name)
+        self.names[obj_id] = name
+        self.keys[obj_id] = keys
+        for key in keys:
+            for gram in _grams(key):
+                self.postings[gram].add(obj_id)
+
+    def remove(self, obj_id):
+        keys = self.keys.pop(obj_id, None)
+        self.names.pop(obj_id, None)
+        if not keys:
+            return
+        for key in keys:
+            for gram in _grams(key):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(obj_id)
+                    if not ids:
+                        del self.postings[gram]
+
+    def search(self, query, limit):
+        if len(query) == 1:
+            candidates = self.postings.get(query, ())
+        else:
+            gram_sets = [self.postings.get(query[i:i + 2]) for i in range(len(query) - 1)]
+            if not all(gram_sets):
+                return []
+            gram_sets.sort(key=len)
+            candidates = set(gram_sets[0]).intersection(*gram_sets[1:])
+
+        ranked = []
+        for obj_id in candidates:
+            best = None
+            for key in self.keys[obj_id]:
+                pos = key.find(query)
+                if pos < 0:
+                    continue
+                rank = (0 if key == query else 1 if pos == 0 else 2, len(key))
+                if best is None or rank < best:
+                    best = rank
+            if best is not None:
+                ranked.append((best, obj_id))
+
+        ranked.sort()
+        return [{'id': obj_id, 'name': self.names[obj_id]} for _, obj_id in ranked[:limit]]
+
+
+def _site_scoped(entity):
+    return issubclass(SEARCH_ENTITIES[entity], SiteScopedMixin)
+
+
+class SearchIndex:
+    """菜品、食材、客户名称的内存检索索引（支持子串与拼音首字母）
+
+    客户按站点分别建立索引，菜品、食材为各站点共用。
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        app.extensions['search_index'] = self
+        track_commits('search_index_pending', SEARCH_ENTITIES.values(),
+                      lambda obj: (getattr(obj, 'site_id', None), obj.name), self._apply_changes)
+
+    def _ensure_built(self, entity):
+        key = (entity, current_site_id() if _site_scoped(entity) else None)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                model = SEARCH_ENTITIES[entity]
+                index = _EntityIndex()
+                with site_scope(key[1]):
+                    for obj_id, name in db.session.query(model.id, model.name):
+                        index.add(obj_id, name)
+                self._indexes[key] = index
+        return index
+
+    def rebuild(self, entity=None):
+        """丢弃索引（不指定实体时丢弃全部），下次查询时重建"""
+        with self._lock:
+            for key in list(self._indexes):
+                if entity is None or key[0] == entity:
+                    del self._indexes[key]
+
+    def search(self, entity, query, limit=10):
+        query = (query or '').strip().lower()
+        if not query:
+            return []
+        index = self._ensure_built(entity)
+        with self._lock:
+            return index.search(query, limit)
+
+    def _apply_changes(self, changes):
+        with self._lock:
+            for op, model, obj_id, data in changes:
+                entity = _MODEL_ENTITIES[model]
+                for (index_entity, site_id), index in self._indexes.items():
+                    if index_entity != entity:
+                        continue
+                    if op == 'delete':
+                        index.remove(obj_id)
+                    elif site_id is None or site_id == data[0]:
+                        index.add(obj_id, data[1])
+                    else:
+                        index.remove(obj_id)
+
+
+search_index = SearchIndex()
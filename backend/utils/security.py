@@ -1,7 +1,8 @@
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 from models import User
+from sqlalchemy.orm.exc import StaleDataError
 from functools import wraps
-from flask import jsonify
+from flask import jsonify, g
 
 ROLE_PERMISSIONS = {
     'admin': ['create', 'read', 'update', 'delete', 'upload', 'init'],
@@ -228,18 +229,35 @@ RESOURCE_PERMISSIONS = {
         'sales': ['read'],
         'chef_assistant': ['read'],
         'delivery_staff': ['read']
+    },
+    'audit_log': {
+        'admin': ['read', 'consume'],
+        'nutritionist': [],
+        'chef': [],
+        'admin_staff': ['read'],
+        'head_nurse': [],
+        'nurse': [],
+        'caregiver': [],
+        'customer': [],
+        'guest': [],
+        'sales': [],
+        'chef_assistant': [],
+        'delivery_staff': []
     }
 }
 
-def get_current_user():
+def get_current_user(locations=None):
     try:
-        verify_jwt_in_request()
+        verify_jwt_in_request(locations=locations)
         user_id = int(get_jwt_identity())
         user = User.query.get(user_id)
         return user
     except:
         return None
 
+def has_resource_permission(role, resource, action):
+    return action in RESOURCE_PERMISSIONS.get(resource, {}).get(role, [])
+
 def requires_permission(action):
     def decorator(f):
         @wraps(f)
@@ -259,6 +277,23 @@ def requires_permission(action):
         return decorated_function
     return decorator
 
+def requires_user(locations=None):
+    """需要后台用户登录：用户从数据库加载（存入 g.current_user），不信任令牌中的角色；小程序令牌无法通过
+
+    locations 指定本接口读取令牌的位置（默认取 JWT_TOKEN_LOCATION）
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user = get_current_user(locations)
+            if not user:
+                return jsonify({'error': 'Authentication required'}), 401
+            
+            g.current_user = user
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
 def requires_resource_permission(resource, action):
     def decorator(f):
         @wraps(f)
@@ -290,4 +325,7 @@ def validate_data(data, required_fields=None):
     return True, None
 
 def handle_error(e):
+    if isinstance(e, StaleDataError):
+        # 乐观锁冲突：记录已被其他请求修改（version 不一致）
+        return jsonify({'error': 'Record was modified by another request, please reload and retry'}), 409
     return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,87 @@
+from models import SiteScopedMixin
+from flask import has_request_context, request
+from flask_jwt_extended import get_jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_UNSET = object()
+_NO_SITE = 0
+_site_override = ContextVar('site_override', default=_UNSET)
+
+
+def current_site_id():
+    """当前请求所属站点ID
+
+    站点账号取 JWT 中的 site_id；总部账号（未绑定站点）可通过 X-Site-Id 请求头指定站点；
+    未绑定客户的小程序令牌返回 0（不匹配任何站点数据）。
+    返回 None 表示不按站点过滤（总部账号、脚本、后台任务）。
+    """
+    override = _site_override.get()
+    if override is not _UNSET:
+        return override
+    if not has_request_context():
+        return None
+    try:
+        claims = get_jwt()
+    except RuntimeError:
+        return None
+    site_id = claims.get('site_id')
+    if site_id is not None:
+        return site_id
+    if claims.get('wechat_user_id') is not None and claims.get('customer_id') is None:
+        # 未绑定客户的小程序用户不属于任何站点，不能按总部账号处理
+        return _NO_SITE
+    header = request.headers.get('X-Site-Id', '')
+    return int(header) if header.isdigit() else None
+
+
+@contextmanager
+def site_scope(site_id):
+    """在指定站点范围内执行查询（后台任务、脚本使用）；site_id 为 None 表示全部站点"""
+    token = _site_override.set(site_id)
+    try:
+        yield
+    finally:
+        _site_override.reset(token)
+
+
+def _scope_query(state):
+    if state.is_column_load or state.is_relationship_load:
+        return
+    if not (state.is_select or state.is_update or state.is_delete):
+        return
+    if state.execution_options.get('all_sites', False):
+        return
+    site_id = current_site_id()
+    if site_id is None:
+        return
+    state.statement = state.statement.options(
+        with_loader_criteria(SiteScopedMixin, lambda cls: cls.site_id == site_id, include_aliases=True)
+    )
+
+
+def _assign_site(session, flush_context, instances):
+    site_id = current_site_id()
+    if site_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, SiteScopedMixin) and obj.site_id is None:
+            obj.site_id = site_id
+
+
+class SiteScoping:
+    """多站点数据隔离：站点数据的 ORM 查询自动附加 site_id 条件，新增记录自动归属当前站点
+
+    Core 层批量 INSERT 不经过 ORM 事件，调用方需自行写入 site_id。
+    需要跨站点查询时使用 execution_options(all_sites=True) 或 site_scope(None)。
+    """
+
+    def init_app(self, app):
+        app.extensions['site_scoping'] = self
+        event.listen(Session, 'do_orm_execute', _scope_query)
+        event.listen(Session, 'before_flush', _assign_site)
+
+
+site_scoping = SiteScoping()
@@ -0,0 +1,149 @@
+from extensions import db
+from models import Customer, WeChatUser, CustomerWeChat
+from utils.change_tracking import track_commits
+from flask import g, jsonify, current_app
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from urllib.request import urlopen
+import json
+import threading
+import time
+
+CODE2SESSION_URL = 'https://api.weixin.qq.com/sns/jscode2session'
+WECHAT_IDENTITY_PREFIX = 'wechat:'
+# 小程序令牌的角色不在 RESOURCE_PERMISSIONS 中，没有任何后台权限
+WECHAT_ROLE = 'wechat'
+
+
+def exchange_code(code):
+    """用 wx.login 的 code 换取 openid（微信 code2Session 接口）"""
+    appid = current_app.config.get('WECHAT_APPID')
+    secret = current_app.config.get('WECHAT_SECRET')
+    if not appid or not secret:
+        raise ValueError('WeChat login is not configured')
+
+    query = urlencode({'appid': appid, 'secret': secret, 'js_code': code, 'grant_type': 'authorization_code'})
+    with urlopen(f'{CODE2SESSION_URL}?{query}', timeout=5) as response:
+        result = json.loads(response.read().decode('utf-8'))
+    if result.get('errcode') or not result.get('openid'):
+        raise ValueError(f"WeChat login failed: {result.get('errmsg', 'no openid returned')}")
+    return result['openid']
+
+
+def _bound_wechat_users(binding):
+    """绑定记录涉及的微信用户（改绑时包括原微信用户）"""
+    history = inspect(binding).attrs.wechat_user_id.history
+    return {binding.wechat_user_id, *history.deleted}
+
+
+class WeChatSessionCache:
+    """微信用户 -> 绑定客户 的有界 LRU 缓存
+
+    本进程内的绑定变更提交后立即失效；其他进程的变更在缓存项过期（ttl 秒）后生效。
+    """
+
+    def __init__(self, capacity=10000, ttl=60):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._bindings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['wechat_sessions'] = self
+        self.capacity = app.config.get('WECHAT_SESSION_CACHE_SIZE', self.capacity)
+        self.ttl = app.config.get('WECHAT_SESSION_CACHE_TTL', self.ttl)
+        track_commits('wechat_session_pending', [CustomerWeChat], _bound_wechat_users, self._apply_changes)
+
+    def _apply_changes(self, changes):
+        with self._lock:
+            for op, model, obj_id, wechat_user_ids in changes:
+                if op == 'delete':
+                    # 删除时取不到 wechat_user_id，直接清空
+                    self._bindings.clear()
+                    return
+                for wechat_user_id in wechat_user_ids:
+                    self._bindings.pop(wechat_user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._bindings.clear()
+
+    def binding(self, wechat_user_id, fresh=False):
+        """返回 (customer_id, site_id)，未绑定客户时为 (None, None)；fresh=True 时忽略缓存直接查库"""
+        now = time.monotonic()
+        if not fresh:
+            with self._lock:
+                cached = self._bindings.get(wechat_user_id)
+                if cached is not None and cached[1] > now:
+                    self._bindings.move_to_end(wechat_user_id)
+                    return cached[0]
+
+        row = db.session.query(CustomerWeChat.customer_id, Customer.site_id).join(
+            Customer, Customer.id == CustomerWeChat.customer_id
+        ).filter(CustomerWeChat.wechat_user_id == wechat_user_id).execution_options(all_sites=True).first()
+        binding = (row.customer_id, row.site_id) if row else (None, None)
+
+        with self._lock:
+            self._bindings[wechat_user_id] = (binding, now + self.ttl)
+            self._bindings.move_to_end(wechat_user_id)
+            while len(self._bindings) > self.capacity:
+                self._bindings.popitem(last=False)
+        return binding
+
+
+wechat_sessions = WeChatSessionCache()
+
+
+def login_wechat_user(openid, nickname=None, avatar=None):
+    """按 openid 登录（首次登录时创建微信用户），返回携带已解析客户ID的访问令牌"""
+    wechat_user = WeChatUser.query.filter_by(openid=openid).first()
+    if wechat_user is None:
+        wechat_user = WeChatUser(openid=openid, nickname=nickname, avatar=avatar)
+        db.session.add(wechat_user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 同一 openid 并发首次登录，另一个请求已创建
+            db.session.rollback()
+            wechat_user = WeChatUser.query.filter_by(openid=openid).one()
+
+    return wechat_access_token(wechat_user.id), wechat_user, wechat_sessions.binding(wechat_user.id)[0]
+
+
+def wechat_access_token(wechat_user_id, fresh=False):
+    """按当前绑定关系签发小程序访问令牌；刷新令牌续期时传 fresh=True，按数据库中的绑定签发"""
+    customer_id, site_id = wechat_sessions.binding(wechat_user_id, fresh)
+    return create_access_token(identity=f'{WECHAT_IDENTITY_PREFIX}{wechat_user_id}', additional_claims={
+        'role': WECHAT_ROLE,
+        'wechat_user_id': wechat_user_id,
+        'customer_id': customer_id,
+        'site_id': site_id
+    })
+
+
+def wechat_session_required(require_customer=True):
+    """小程序接口：从令牌直接取客户ID（g.customer_id），仅用缓存校验绑定是否仍然有效"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            verify_jwt_in_request()
+            claims = get_jwt()
+            wechat_user_id = claims.get('wechat_user_id')
+            if wechat_user_id is None:
+                return jsonify({'error': 'WeChat session required'}), 401
+
+            customer_id, _ = wechat_sessions.binding(wechat_user_id)
+            if customer_id != claims.get('customer_id'):
+                return jsonify({'error': 'WeChat binding changed, please log in again'}), 401
+            if require_customer and customer_id is None:
+                return jsonify({'error': 'WeChat user is not bound to a customer'}), 403
+
+            g.wechat_user_id = wechat_user_id
+            g.customer_id = customer_id
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
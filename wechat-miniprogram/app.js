@@ -4,14 +4,38 @@ App({
     logs.unshift(Date.now())
     wx.setStorageSync('logs', logs)
     this.initRequest()
+    this.login()
   },
   
   initRequest() {
     wx.request({ timeout: 10000 })
   },
   
+  login() {
+    return new Promise((resolve, reject) => {
+      wx.login({
+        success: ({ code }) => {
+          this.request('/wechat/login', 'POST', { code }).then((res) => {
+            this.globalData.token = res.access_token
+            this.globalData.customerId = res.customer_id
+            wx.setStorageSync('token', res.access_token)
+            resolve(res)
+          }).catch(reject)
+        },
+        fail: reject
+      })
+    })
+  },
+  
+  authHeader() {
+    const token = this.globalData.token || wx.getStorageSync('token')
+    return token ? { 'Authorization': 'Bearer ' + token } : {}
+  },
+  
   globalData: {
     userInfo: null,
+    token: null,
+    customerId: null,
     baseUrl: 'http://localhost:5000/api',
     isAdmin: false
   },
@@ -23,7 +47,8 @@ App({
         method: method,
         data: data,
         header: {
-          'Content-Type': 'application/json'
+          'Content-Type': 'application/json',
+          ...this.authHeader()
         },
         success: (res) => {
           if (res.statusCode === 200) {
@@ -46,6 +71,7 @@ App({
         filePath: filePath,
         name: name,
         formData: formData,
+        header: this.authHeader(),
         success: (res) => {
           if (res.statusCode === 200) {
             resolve(JSON.parse(res.data))